@@ -2,6 +2,7 @@ from flask import Flask, render_template, request, jsonify, redirect, url_for, f
 from functools import wraps
 import os
 import sys
+import threading
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from program import TicketSystem # type: ignore
 from datetime import datetime
@@ -10,10 +11,14 @@ app = Flask(__name__)
 # 使用随机生成的密钥
 app.secret_key = os.urandom(24)
 
-# 创建全局数据库连接
+# 创建全局售票系统，各请求线程从其连接池借用连接
+_ticket_system_lock = threading.Lock()
+
 def get_db():
     if not hasattr(app, 'ticket_system'):
-        app.ticket_system = TicketSystem()
+        with _ticket_system_lock:
+            if not hasattr(app, 'ticket_system'):
+                app.ticket_system = TicketSystem()
     return app.ticket_system
 
 # 添加登录要求装饰器
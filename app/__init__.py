@@ -13,12 +13,34 @@ def create_app(test_config=None):
     from app.models import close_db
     app.teardown_appcontext(close_db)
     
+    # 监控指标和慢查询日志，需在打开数据库连接之前开启
+    from app.metrics import init_metrics
+    init_metrics(app)
+    from app.models.slow_queries import init_slow_query_log
+    init_slow_query_log(app)
+    
+    # 按配置切换统计模式，事件模式下启动后台汇总线程
+    from app.models.statistics import init_statistics
+    init_statistics(app)
+    
+    # 最后登录时间写回缓冲
+    from app.models.login_buffer import init_login_buffer
+    init_login_buffer(app)
+    
+    # 单写线程，合并并发的写请求批量提交
+    from app.models.write_queue import init_write_queue
+    init_write_queue(app)
+    
     # 注册蓝图
     from app.routes import admin, auth, tickets
     app.register_blueprint(admin.bp)
     app.register_blueprint(auth.bp)
     app.register_blueprint(tickets.bp)
     
+    # 注册命令行命令
+    from app.cli import register_commands
+    register_commands(app)
+    
     # 注册首页路由
     from app.routes.index import bp as index_bp
     app.register_blueprint(index_bp)
@@ -0,0 +1,171 @@
+"""ASGI 服务模式
+
+与 WSGI 共用同一个 Flask 应用，由事件循环接收请求，按端点分派到有界线程池执行：
+
+- 车次查询、个人车票查询使用查询线程池
+- 销售报表、统计数据使用报表线程池，慢报表不会占满查询线程
+- 其余请求在通用线程池中按原 WSGI 方式处理
+
+查询和报表线程各自持有独立连接(见 DBExecutor)，排队中的请求只占用事件循环上的
+协程，不占用线程。Flask 视图本身是同步的，整个视图(包括模板渲染)在线程池中执行。
+
+    uvicorn asgi:app
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from app.models.db_executor import DBExecutor
+
+DEFAULT_SEARCH_WORKERS = 8
+DEFAULT_REPORT_WORKERS = 2
+DEFAULT_WSGI_WORKERS = 16
+
+SEARCH_ENDPOINTS = frozenset(('tickets.search', 'tickets.search_person'))
+REPORT_ENDPOINTS = frozenset(('admin.reports', 'admin.statistics'))
+
+
+def build_environ(scope, body):
+    """由 ASGI HTTP scope 构造 WSGI environ"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        # 请求体已完整读入，分块传输的请求也能按结束位置读取
+        'wsgi.input_terminated': True,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            key = 'CONTENT_TYPE'
+        elif name == 'CONTENT_LENGTH':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    if body and 'CONTENT_LENGTH' not in environ:
+        environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+class AsyncReadApp:
+    """把 Flask 应用包装为 ASGI 应用，只读端点在带独立连接的线程池中执行"""
+
+    def __init__(self, flask_app):
+        config = flask_app.config
+        database = config['DATABASE']
+        self.flask_app = flask_app
+        self.search_executor = DBExecutor(
+            database, config.get('ASYNC_SEARCH_WORKERS', DEFAULT_SEARCH_WORKERS),
+            config=config, name='search')
+        self.report_executor = DBExecutor(
+            database, config.get('ASYNC_REPORT_WORKERS', DEFAULT_REPORT_WORKERS),
+            config=config, name='report')
+        self.wsgi_executor = ThreadPoolExecutor(
+            max_workers=config.get('ASYNC_WSGI_WORKERS', DEFAULT_WSGI_WORKERS),
+            thread_name_prefix='wsgi-executor')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        environ = build_environ(scope, b''.join(chunks))
+        loop = asyncio.get_running_loop()
+        future = self.executor_for(environ).submit(self._run_wsgi, environ, loop, send)
+        await asyncio.wrap_future(future)
+
+    def executor_for(self, environ):
+        """按请求匹配到的端点选择线程池"""
+        adapter = self.flask_app.url_map.bind_to_environ(environ)
+        try:
+            endpoint, _ = adapter.match()
+        except HTTPException:
+            return self.wsgi_executor
+        if endpoint in SEARCH_ENDPOINTS:
+            return self.search_executor
+        if endpoint in REPORT_ENDPOINTS:
+            return self.report_executor
+        return self.wsgi_executor
+
+    def _run_wsgi(self, environ, loop, send):
+        """在线程池中执行 WSGI 应用，逐块把响应交给事件循环发送"""
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response_start = {}
+
+        def start_response(status, headers, exc_info=None):
+            response_start['status'] = int(status.split(' ', 1)[0])
+            response_start['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        def emit_start():
+            emit({'type': 'http.response.start', **response_start})
+            response_start.clear()
+
+        result = self.flask_app(environ, start_response)
+        try:
+            for chunk in result:
+                if not chunk:
+                    continue
+                if response_start:
+                    emit_start()
+                emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if response_start:
+                emit_start()
+            emit({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    def shutdown(self):
+        self.search_executor.shutdown()
+        self.report_executor.shutdown()
+        self.wsgi_executor.shutdown()
+
+
+def create_asgi_app(test_config=None):
+    """创建 ASGI 模式的应用"""
+    return AsyncReadApp(create_app(test_config))
@@ -0,0 +1,51 @@
+import click
+from flask import current_app
+
+from app.models import get_db
+from app.models.bulk_load import DEFAULT_CHUNK_SIZE, bulk_load
+
+
+@click.command('generate-data')
+@click.option('--trains', default=500, show_default=True, help='生成的车次数')
+@click.option('--users', default=10000, show_default=True, help='生成的注册用户数')
+@click.option('--tickets', default=1000000, show_default=True, help='生成的订单数')
+@click.option('--refund-rate', default=0.05, show_default=True, help='已退票比例')
+@click.option('--group-rate', default=0.1, show_default=True, help='团体票比例')
+@click.option('--days', default=365, show_default=True, help='乘车日期覆盖今天之前的天数')
+@click.option('--future-days', default=30, show_default=True, help='乘车日期覆盖今天之后的天数')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True,
+              help='每个事务写入的订单数')
+@click.option('--seed', type=int, default=None, help='随机种子，相同种子生成相同数据')
+def generate_data_command(trains, users, tickets, refund_rate, group_rate, days,
+                          future_days, chunk_size, seed):
+    """生成车次、用户和订单并批量导入数据库"""
+    # 确保表结构存在
+    db = get_db()
+    db.create_tables()
+    db.close_db()
+
+    def progress(phase, done, total):
+        if phase == 'tickets':
+            click.echo(f'\r订单: {done}/{total}', nl=done >= total)
+        else:
+            click.echo(f'{phase}: {done}/{total}')
+
+    try:
+        result = bulk_load(
+            current_app.config['DATABASE'],
+            trains=trains, users=users, tickets=tickets,
+            refund_rate=refund_rate, group_rate=group_rate,
+            days=days, future_days=future_days,
+            chunk_size=chunk_size, seed=seed, progress=progress,
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"导入完成: 车次 {result['trains']}，用户 {result['users']}，"
+               f"订单 {result['tickets']}")
+    for phase, seconds in result['timings'].items():
+        click.echo(f'  {phase}: {seconds}s')
+
+
+def register_commands(app):
+    """注册 flask 命令行命令"""
+    app.cli.add_command(generate_data_command)
@@ -0,0 +1,220 @@
+"""进程内监控指标
+
+记录请求延迟、TicketSystem 各方法的耗时和 SQL 语句数、订票/退票/改签结果
+以及写事务的锁重试次数，以 Prometheus 文本格式输出。
+指标只在 init_metrics 之后记录，命令行工具和脚本中不产生开销。
+多进程部署时每个进程分别计数。
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+
+# 请求延迟分桶（秒）
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 方法耗时分桶（秒），多数方法在毫秒级
+METHOD_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# 返回 (成功与否, 消息) 的业务操作
+OPERATION_METHODS = ('book_ticket', 'book_group', 'refund_ticket', 'change_ticket')
+
+enabled = False
+# 是否记录当前执行的 TicketSystem 方法，指标或慢查询日志开启时打开
+tracking = False
+_local = threading.local()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """按标签累加的计数器"""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    """按标签分桶统计耗时，输出累计分桶、总和与次数"""
+
+    def __init__(self, name, help_text, labels=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # [各分桶次数..., +Inf 次数, 总和]
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', '请求处理耗时', ('endpoint', 'method', 'status'))
+METHOD_LATENCY = Histogram(
+    'ticket_system_method_duration_seconds', 'TicketSystem 方法耗时', ('method',),
+    METHOD_BUCKETS)
+SQL_STATEMENTS = Counter(
+    'ticket_system_sql_statements_total', 'TicketSystem 方法执行的 SQL 语句数', ('method',))
+OPERATIONS = Counter(
+    'ticket_operations_total', '订票/退票/改签结果', ('operation', 'result'))
+LOCK_RETRIES = Counter(
+    'db_lock_retries_total', '写事务遇到锁冲突后的重试次数', ('method',))
+LOCK_FAILURES = Counter(
+    'db_lock_failures_total', '重试耗尽仍因锁冲突失败的写事务数', ('method',))
+
+REGISTRY = (REQUEST_LATENCY, METHOD_LATENCY, SQL_STATEMENTS, OPERATIONS,
+            LOCK_RETRIES, LOCK_FAILURES)
+
+
+def enable_tracking():
+    """开始记录当前线程正在执行的 TicketSystem 方法"""
+    global tracking
+    tracking = True
+
+
+def current_method():
+    """当前线程正在执行的 TicketSystem 方法名"""
+    return getattr(_local, 'method', None) or 'other'
+
+
+def set_current_method(name):
+    """在代为执行的线程(如写线程)中标记当前方法，None 表示清除"""
+    _local.method = name
+
+
+def trace_statement(statement):
+    """sqlite3 trace 回调：将语句计入当前方法(触发器内的语句不单独计数)"""
+    if enabled and not statement.startswith('--'):
+        SQL_STATEMENTS.inc(current_method())
+
+
+def record_lock_retry():
+    if enabled:
+        LOCK_RETRIES.inc(current_method())
+
+
+def record_lock_failure():
+    if enabled:
+        LOCK_FAILURES.inc(current_method())
+
+
+def instrument(cls):
+    """类装饰器：为所有公开方法记录耗时、SQL 语句数和业务操作结果"""
+    for name, func in list(vars(cls).items()):
+        if name.startswith('_') or not callable(func) or name in ('get_db', 'close_db'):
+            continue
+        setattr(cls, name, _instrument_method(name, func))
+    return cls
+
+
+def _instrument_method(name, func):
+    is_operation = name in OPERATION_METHODS
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not tracking:
+            return func(*args, **kwargs)
+        # 方法间相互调用时只统计最外层
+        outer = getattr(_local, 'method', None)
+        if outer is not None:
+            return func(*args, **kwargs)
+        _local.method = name
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            _local.method = None
+            if enabled:
+                METHOD_LATENCY.observe(time.perf_counter() - started, name)
+        if enabled and is_operation and isinstance(result, tuple) and result:
+            OPERATIONS.inc(name, 'success' if result[0] else 'failure')
+        return result
+
+    return wrapper
+
+
+def render():
+    """所有指标的 Prometheus 文本"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """按配置开启指标，并记录每个请求的处理耗时"""
+    global enabled
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    enabled = True
+    enable_tracking()
+
+    @app.before_request
+    def start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            REQUEST_LATENCY.observe(time.perf_counter() - started,
+                                    request.endpoint or 'unmatched', request.method,
+                                    response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failed_request(error):
+        # 未处理的异常不会经过 after_request
+        started = g.pop('_metrics_started', None)
+        if started is not None and error is not None:
+            REQUEST_LATENCY.observe(time.perf_counter() - started,
+                                    request.endpoint or 'unmatched', request.method, 500)
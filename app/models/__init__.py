@@ -1,14 +1,24 @@
 from flask import g, current_app
+from app.models.db_executor import thread_system
+from app.models.db_pool import get_app_pool
 from app.models.ticket_system import TicketSystem
 
 def get_db():
-    """获取数据库实例"""
+    """获取数据库实例，连接取自进程级连接池
+
+    在 DBExecutor 线程中处理的请求直接使用线程自己的连接。
+    """
+    system = thread_system()
+    if system is not None:
+        return system
     if 'db' not in g:
-        g.db = TicketSystem(current_app.config['DATABASE'])
+        g.db = TicketSystem(current_app.config['DATABASE'],
+                            pool=get_app_pool(current_app.config),
+                            config=current_app.config)
     return g.db
 
 def close_db(e=None):
-    """关闭数据库连接"""
+    """请求结束时归还数据库连接"""
     db = g.pop('db', None)
     if db is not None:
         db.close_db() 
\ No newline at end of file
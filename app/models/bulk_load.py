@@ -0,0 +1,326 @@
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from app.models.seat_inventory import get_seat_inventory
+from app.models.statistics import rebuild_statistics
+from app.models.train_catalog import TrainCatalog, get_train_catalog
+
+# 导入期间使用的 PRAGMA：不等待落盘、暂停自动检查点、加大页缓存
+LOAD_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'OFF',
+    'wal_autocheckpoint': 0,
+    'cache_size': -512000,         # 负数表示 KiB，即 512MB 页缓存
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'OFF',
+}
+
+DEFAULT_CHUNK_SIZE = 50000
+
+STATIONS = ('北京', '上海', '广州', '深圳', '武汉', '成都', '西安', '南京', '杭州', '重庆',
+            '长沙', '郑州', '天津', '济南', '沈阳', '哈尔滨', '昆明', '贵阳', '南宁', '福州',
+            '厦门', '合肥', '南昌', '太原', '石家庄', '兰州', '乌鲁木齐', '呼和浩特', '青岛', '大连')
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈'
+GIVEN_CHARS = '伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超兰霞平刚桂华建国文辉鹏飞宇浩然子涵欣怡梓轩雨桐思远嘉博'
+REGION_CODES = ('110101', '310104', '440106', '440305', '420106', '510107', '610113',
+                '320106', '330106', '500103', '430104', '410105', '120101', '370102')
+
+# 车次类型: (前缀, 座位数, 平均时速 km/h, 每公里票价)
+TRAIN_TYPES = (
+    ('G', 600, 300, 0.46),
+    ('D', 500, 200, 0.31),
+    ('K', 900, 90, 0.12),
+)
+
+GROUP_SIZE_RANGE = (5, 30)     # 团体订单人数
+BOOKING_LEAD_DAYS = 30         # 最早提前多少天订票
+MAX_PLACEMENT_ATTEMPTS = 100   # 随机选择车次日期连续落空多少次后改为顺序查找空座
+
+
+def _id_number(rng, n):
+    """生成第 n 个身份证号：地区码 + 出生日期 + 4位序号，(出生日期, 序号) 由 n 唯一确定"""
+    birth = date(1950, 1, 1) + timedelta(days=n % 20000)
+    return f'{rng.choice(REGION_CODES)}{birth:%Y%m%d}{n // 20000 % 10000:04d}'
+
+
+def _name(person):
+    """按序号确定性地生成姓名，相同序号得到相同姓名"""
+    surname = SURNAMES[person % len(SURNAMES)]
+    rest = person // len(SURNAMES)
+    given = GIVEN_CHARS[rest % len(GIVEN_CHARS)]
+    if person % 3:
+        given += GIVEN_CHARS[(rest // len(GIVEN_CHARS)) % len(GIVEN_CHARS)]
+    return surname + given
+
+
+def generate_trains(rng, count):
+    """生成车次时刻表：运行时长和票价按车型和里程估算，发车时间按 5 分钟取整"""
+    trains = []
+    for n in range(count):
+        prefix, seats, speed, fare = rng.choice(TRAIN_TYPES)
+        departure, destination = rng.sample(STATIONS, 2)
+        distance = rng.randrange(200, 2500)
+        duration = max(30, int(distance / speed * 60) // 5 * 5)
+        minute = rng.randrange(6 * 60, 22 * 60, 5)
+        arrival = (minute + duration) % (24 * 60)
+        trains.append((
+            f'{prefix}{n + 1000}', departure, destination,
+            f'{minute // 60:02d}:{minute % 60:02d}',
+            f'{arrival // 60:02d}:{arrival % 60:02d}',
+            seats, round(distance * fare, 1),
+        ))
+    return trains
+
+
+def generate_users(rng, count, start=0):
+    """生成注册用户，返回 (用户行, [(姓名, 身份证号)])"""
+    users = []
+    identities = []
+    for n in range(start, start + count):
+        name = _name(n)
+        id_number = _id_number(rng, n)
+        users.append((
+            f'u{n:07d}', 'pass123', name, id_number,
+            f'1{rng.choice("3578")}{rng.randrange(10 ** 9):09d}', f'u{n:07d}@example.com',
+        ))
+        identities.append((name, id_number))
+    return users, identities
+
+
+def _day_strings(days, future_days):
+    """订票时间可能落在的日期，前 BOOKING_LEAD_DAYS 天之后的部分为乘车日期"""
+    first_day = date.today() - timedelta(days=days)
+    span = days + future_days + 1
+    return [(first_day + timedelta(days=i - BOOKING_LEAD_DAYS)).strftime('%Y-%m-%d')
+            for i in range(span + BOOKING_LEAD_DAYS)]
+
+
+def ticket_capacity(trains, days, future_days, seats_used=None):
+    """乘车日期范围内所有车次剩余的座位数，即最多还能生成的车票数"""
+    seats_used = seats_used or {}
+    travel_dates = _day_strings(days, future_days)[BOOKING_LEAD_DAYS:]
+    return sum(max(train[5] - seats_used.get((train[0], travel_date), 0), 0)
+               for train in trains for travel_date in travel_dates)
+
+
+def _find_free_seat(train_seats, day_strings, seats_used):
+    """顺序查找仍有空座的 (车次, 总座位数, 乘车日期下标)，没有时返回 None"""
+    for day in range(len(day_strings) - BOOKING_LEAD_DAYS):
+        travel_date = day_strings[day + BOOKING_LEAD_DAYS]
+        for train_id, total_seats in train_seats:
+            if seats_used.get((train_id, travel_date), 0) < total_seats:
+                return train_id, total_seats, day
+    return None
+
+
+def generate_tickets(rng, count, trains, identities, refund_rate=0.05, group_rate=0.1,
+                     days=365, future_days=30, chunk_size=DEFAULT_CHUNK_SIZE, seats_used=None):
+    """按块生成订单行
+
+    乘车日期分布在今天之前 days 天到之后 future_days 天之间，订票时间提前 0-30 天。
+    约 group_rate 比例的车票属于团体订单：同车次同日期连号。
+    同一 (车次, 乘车日期) 的座位号接着 seats_used 中已用的最大座位号递增，
+    座位售完后换一个车次或日期；所有座位都已售完时抛出 ValueError。
+    """
+    span = days + future_days + 1
+    day_strings = _day_strings(days, future_days)
+    today_index = days + BOOKING_LEAD_DAYS
+    extra_people = max(count // 3, 1)    # 非注册乘客，平均每人约 3 张票
+    seats_used = dict(seats_used or {})
+    train_seats = [(train[0], train[5]) for train in trains]
+    # 按团体平均人数把车票比例换算为订单比例
+    average_group = sum(GROUP_SIZE_RANGE) / 2
+    group_order_rate = group_rate / (average_group - group_rate * (average_group - 1))
+
+    chunk = []
+    produced = 0
+    attempts = 0
+    while produced < count:
+        train_id, total_seats = rng.choice(train_seats)
+        day = rng.randrange(span)
+        size = 1
+        if rng.random() < group_order_rate:
+            size = min(rng.randint(*GROUP_SIZE_RANGE), count - produced)
+        if attempts >= MAX_PLACEMENT_ATTEMPTS:
+            # 座位已基本售完，顺序查找空座并只出单张票
+            free = _find_free_seat(train_seats, day_strings, seats_used)
+            if free is None:
+                raise ValueError(f"座位已全部售完，只生成了 {produced} 张车票")
+            train_id, total_seats, day = free
+            size = 1
+        travel_index = day + BOOKING_LEAD_DAYS
+        travel_date = day_strings[travel_index]
+        key = (train_id, travel_date)
+        first_seat = seats_used.get(key, 0) + 1
+        if first_seat + size - 1 > total_seats:
+            attempts += 1
+            continue
+        attempts = 0
+        seats_used[key] = first_seat + size - 1
+
+        booking_index = min(travel_index - rng.randrange(BOOKING_LEAD_DAYS + 1), today_index)
+        seconds = rng.randrange(86400)
+        booking_time = (f'{day_strings[booking_index]} '
+                        f'{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}')
+        is_group = size > 1
+
+        for seat_number in range(first_seat, first_seat + size):
+            if identities and rng.random() < 0.5:
+                name, id_number = rng.choice(identities)
+            else:
+                person = rng.randrange(extra_people)
+                name, id_number = _name(person), f'9{person:017d}'
+            status = '已退' if rng.random() < refund_rate else '已售'
+            chunk.append((train_id, name, id_number, seat_number, booking_time,
+                          status, is_group, travel_date))
+        produced += size
+
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _defer(cursor, kind, table):
+    """删除表上的二级索引或触发器，返回重建用的 SQL"""
+    cursor.execute('''
+    SELECT name, sql FROM sqlite_master
+    WHERE type = ? AND tbl_name = ? AND sql IS NOT NULL
+    ''', (kind, table))
+    saved = cursor.fetchall()
+    for name, _ in saved:
+        cursor.execute(f'DROP {kind.upper()} IF EXISTS {name}')
+    return [sql for _, sql in saved]
+
+
+def bulk_load(database, trains=500, users=10000, tickets=1000000, refund_rate=0.05,
+              group_rate=0.1, days=365, future_days=30, chunk_size=DEFAULT_CHUNK_SIZE,
+              seed=None, progress=None):
+    """向已建表的数据库批量写入车次、用户和订单
+
+    - 导入前删除 tickets 上的二级索引和触发器，导入后按原 SQL 一次性重建
+    - 每块订单一个事务，导入期间 synchronous=OFF 并暂停 WAL 自动检查点
+    - 结束后按 tickets 表重建统计表、姓名全文索引和座位位图，而不是逐行触发
+    progress(阶段, 已完成数, 总数) 用于汇报进度。返回各阶段耗时。
+    """
+    rng = random.Random(seed)
+    report = lambda *args: progress and progress(*args)
+    timings = {}
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(database, isolation_level=None)
+    indexes, triggers = [], []
+    try:
+        for name, value in LOAD_PRAGMAS.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        cursor = conn.cursor()
+
+        # 车次和用户
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT COUNT(*) FROM users')
+        user_rows, identities = generate_users(rng, users, start=cursor.fetchone()[0])
+        cursor.executemany('''
+        INSERT OR IGNORE INTO users
+        (username, password, real_name, id_number, phone, email, created_at, status)
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now'), 'active')
+        ''', user_rows)
+        train_rows = generate_trains(rng, trains)
+        cursor.executemany('''
+        INSERT OR IGNORE INTO trains
+        (train_id, departure, destination, departure_time, arrival_time, total_seats, price)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', train_rows)
+        TrainCatalog.bump_version(cursor)
+        cursor.execute('SELECT train_id, departure, destination, departure_time, '
+                       'arrival_time, total_seats, price FROM trains')
+        all_trains = cursor.fetchall()
+        # 已有订单占用的座位，新订单接着编号
+        cursor.execute('''
+        SELECT train_id, travel_date, MAX(seat_number) FROM tickets
+        WHERE travel_date IS NOT NULL
+        GROUP BY train_id, travel_date
+        ''')
+        seats_used = {(row[0], row[1]): row[2] or 0 for row in cursor.fetchall()}
+        capacity = ticket_capacity(all_trains, days, future_days, seats_used)
+        if tickets > capacity:
+            raise ValueError(f"订单数 {tickets} 超过 {len(all_trains)} 个车次在乘车日期范围内"
+                             f"剩余的座位数 {capacity}")
+
+        # 推迟索引和触发器
+        indexes = _defer(cursor, 'index', 'tickets')
+        triggers = _defer(cursor, 'trigger', 'tickets')
+        cursor.execute('COMMIT')
+        timings['prepare'] = time.perf_counter() - started
+
+        # 订单，每块一个事务
+        phase = time.perf_counter()
+        loaded = 0
+        for chunk in generate_tickets(rng, tickets, all_trains, identities, refund_rate,
+                                      group_rate, days, future_days, chunk_size,
+                                      seats_used):
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.executemany('''
+            INSERT INTO tickets
+            (train_id, passenger_name, passenger_id, seat_number,
+             booking_time, status, is_group, travel_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', chunk)
+            cursor.execute('COMMIT')
+            loaded += len(chunk)
+            report('tickets', loaded, tickets)
+        timings['tickets'] = time.perf_counter() - phase
+
+        # 重建索引
+        phase = time.perf_counter()
+        cursor.execute('BEGIN IMMEDIATE')
+        for n, sql in enumerate(indexes, 1):
+            cursor.execute(sql)
+            report('indexes', n, len(indexes))
+        cursor.execute('COMMIT')
+        timings['indexes'] = time.perf_counter() - phase
+
+        # 统计表、姓名索引、座位位图
+        phase = time.perf_counter()
+        cursor.execute('BEGIN IMMEDIATE')
+        rebuild_statistics(cursor)
+        report('statistics', 1, 1)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'tickets_name_fts'")
+        if cursor.fetchone():
+            cursor.execute("INSERT INTO tickets_name_fts (tickets_name_fts) VALUES ('rebuild')")
+        report('name_index', 1, 1)
+        seats = get_seat_inventory(database)
+        seats.rebuild_all(cursor)
+        report('seat_inventory', 1, 1)
+        for sql in triggers:
+            cursor.execute(sql)
+        cursor.execute('COMMIT')
+        timings['rebuild'] = time.perf_counter() - phase
+
+        phase = time.perf_counter()
+        cursor.execute('ANALYZE')
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        timings['analyze'] = time.perf_counter() - phase
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        # 导入中断时恢复索引和触发器，已写入的订单保留
+        for sql in indexes + triggers:
+            try:
+                conn.execute(sql)
+            except sqlite3.OperationalError:
+                pass
+        raise
+    finally:
+        conn.close()
+
+    get_train_catalog(database).invalidate()
+    timings['total'] = time.perf_counter() - started
+    return {
+        'trains': len(train_rows),
+        'users': len(user_rows),
+        'tickets': loaded,
+        'timings': {phase: round(seconds, 2) for phase, seconds in timings.items()},
+    }
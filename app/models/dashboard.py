@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+# 概览快照的最长使用时间（秒），可由 config.Config 覆盖
+DEFAULT_MAX_AGE = 60.0
+
+# 某车次当日的销售情况，前六列与 get_daily_sales 一致
+DailySales = namedtuple('DailySales', ('train_id', 'departure', 'destination', 'tickets_sold',
+                                       'total_revenue', 'sale_date', 'total_seats'))
+# 管理员概览
+Dashboard = namedtuple('Dashboard', ('date', 'sales', 'train_count', 'total_seats',
+                                     'tickets_sold', 'total_revenue', 'built_at'))
+
+
+class SalesChange:
+    """一次写操作造成的销售变化 {(订票日期, 车次): [票数, 金额]}"""
+    __slots__ = ('items',)
+
+    def __init__(self):
+        self.items = {}
+
+    def add(self, sale_date, train_id, count, amount):
+        item = self.items.setdefault((sale_date, train_id), [0, 0.0])
+        item[0] += count
+        item[1] += amount
+
+
+class DashboardSnapshot:
+    """进程内的当日销售，按车次记录今天售出且未退的票数和金额
+
+    冷启动、跨日或超过 max_age 秒时从 train_daily_sales 重建，其间由本进程的订票、
+    退票、改签在提交后增减。其他进程的售票最多延迟 max_age 秒可见，max_age 为
+    None 时只在冷启动和跨日时重建。
+    """
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE):
+        self.max_age = max_age
+        self._date = None
+        self._sold = {}
+        self._built_at = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # 进行中的写操作数；重建期间新的写操作等待重建完成，
+        # 重建等进行中的写操作结束后再读取，读到的结果与快照增量既不漏计也不重复
+        self._writing = 0
+        self._rebuilding = False
+
+    @contextmanager
+    def change(self):
+        """包住一次写操作，写操作在 yield 的 SalesChange 中记录销售变化
+
+        只有写操作正常结束(已提交)时才计入快照。
+        """
+        sold = SalesChange()
+        with self._changed:
+            while self._rebuilding:
+                self._changed.wait()
+            self._writing += 1
+        try:
+            yield sold
+        except BaseException:
+            sold = None
+            raise
+        finally:
+            with self._changed:
+                self._writing -= 1
+                items = sold.items.items() if sold is not None else ()
+                for (sale_date, train_id), (count, amount) in items:
+                    if sale_date != self._date or not count:
+                        continue
+                    tickets, revenue = self._sold.get(train_id, (0, 0.0))
+                    if tickets + count > 0:
+                        self._sold[train_id] = (tickets + count, revenue + amount)
+                    else:
+                        self._sold.pop(train_id, None)
+                self._changed.notify_all()
+
+    def invalidate(self):
+        with self._lock:
+            self._date = None
+            self._sold = {}
+
+    def _fresh(self, date):
+        if self._date != date:
+            return False
+        return self.max_age is None or time.time() - self._built_at < self.max_age
+
+    def sales(self, date, load):
+        """返回 date 当日各车次的 {车次: (票数, 金额)} 及构建时间
+
+        快照不是当日的或已过期时调用 load(date) 从数据库读取 [(车次, 票数, 金额)]。
+        重建时先挡住新的写操作并等进行中的写操作结束，再读取并装入快照，重建总能生效。
+        读取只按日期取出 train_daily_sales 的几行，新的写操作只多等这一次读取。
+        同时请求的其他线程等待这次重建，不重复读取。
+        """
+        with self._changed:
+            while self._rebuilding:
+                self._changed.wait()
+            if self._fresh(date):
+                return dict(self._sold), self._built_at
+            self._rebuilding = True
+
+        sold = None
+        try:
+            with self._changed:
+                while self._writing:
+                    self._changed.wait()
+            sold = {train_id: (tickets, revenue) for train_id, tickets, revenue in load(date)}
+            built_at = time.time()
+        finally:
+            with self._changed:
+                if sold is not None:
+                    self._date = date
+                    self._sold = dict(sold)
+                    self._built_at = built_at
+                self._rebuilding = False
+                self._changed.notify_all()
+        return sold, built_at
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_dashboard_snapshot(database, max_age=DEFAULT_MAX_AGE):
+    """获取数据库文件对应的进程级概览快照"""
+    key = os.path.abspath(database)
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            snapshot = _snapshots[key] = DashboardSnapshot(max_age)
+        return snapshot
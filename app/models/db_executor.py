@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.models.db_pool import ConnectionPool
+
+DEFAULT_WORKERS = 8
+
+# 执行器线程绑定的 TicketSystem，由 get_db 优先使用
+_thread = threading.local()
+
+
+def thread_system():
+    """当前线程绑定的 TicketSystem，不在执行器线程中时返回 None"""
+    return getattr(_thread, 'system', None)
+
+
+class DBExecutor:
+    """有界线程池，每个线程持有独立连接的 TicketSystem
+
+    线程首次执行任务时打开自己的连接，之后一直复用，不经过进程级连接池，
+    慢查询不会占用其他请求等待的池内连接。排队的任务不占用线程。
+    """
+
+    def __init__(self, database, workers=DEFAULT_WORKERS, config=None, name='db'):
+        self.database = database
+        self.workers = workers
+        self.config = config or {}
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix=f'{name}-executor',
+                                            initializer=self._init_thread)
+        self._systems = []
+        self._lock = threading.Lock()
+
+    def _init_thread(self):
+        # 避免循环导入：ticket_system 依赖 db_pool
+        from app.models.ticket_system import TicketSystem
+        pool = ConnectionPool(self.database, size=1,
+                              pragmas=self.config.get('DB_PRAGMAS'))
+        system = TicketSystem(self.database, pool=pool, config=self.config)
+        _thread.system = system
+        with self._lock:
+            self._systems.append(system)
+
+    def submit(self, func, *args, **kwargs):
+        """在执行器线程中调用 func，返回 concurrent.futures.Future"""
+        return self._executor.submit(self._call, func, args, kwargs)
+
+    @staticmethod
+    def _call(func, args, kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # 连接在线程内长期复用，不能把未结束的读事务带给下一个任务
+            conn = _thread.system.get_db()
+            if conn.in_transaction:
+                conn.rollback()
+
+    async def run(self, func, *args, **kwargs):
+        """在执行器线程中调用 func 并等待结果，不阻塞事件循环"""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        """停止接收任务并关闭各线程的连接"""
+        self._executor.shutdown(wait=wait)
+        with self._lock:
+            systems, self._systems = self._systems, []
+        for system in systems:
+            system.close_db()
+            system.pool.close_all()
@@ -0,0 +1,160 @@
+import os
+import queue
+import sqlite3
+import threading
+
+from app import metrics
+from app.models.slow_queries import get_slow_query_log
+
+# 连接默认参数，可由 config.Config 中的同名配置覆盖
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POOL_TIMEOUT = 30
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,          # 负数表示 KiB，即 64MB 页缓存
+    'mmap_size': 268435456,        # 256MB 内存映射
+    'busy_timeout': 5000,          # 毫秒
+}
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """连接池在等待时间内没有可用连接"""
+
+
+class ConnectionPool:
+    """进程内 SQLite 连接池
+
+    每个连接只在创建时打开一次并设置 PRAGMA，之后在请求之间复用，
+    避免每个请求都重新打开数据库文件、重新加载 schema。
+    """
+
+    def __init__(self, database, size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_POOL_TIMEOUT, pragmas=None):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _connect(self):
+        """打开新连接并设置 PRAGMA"""
+        busy_timeout = self.pragmas.get('busy_timeout', 5000)
+        conn = sqlite3.connect(self.database, timeout=busy_timeout / 1000,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # journal_mode 必须最先设置，其余 PRAGMA 顺序无关
+        ordered = sorted(self.pragmas.items(), key=lambda item: item[0] != 'journal_mode')
+        for name, value in ordered:
+            conn.execute(f'PRAGMA {name} = {value}')
+        self._install_hooks(conn)
+        return conn
+
+    def _install_hooks(self, conn):
+        """按需安装监控指标和慢查询日志的 trace 回调"""
+        hooks = []
+        if metrics.enabled:
+            hooks.append(metrics.trace_statement)
+        slow_log = get_slow_query_log(self.database)
+        if slow_log.enabled:
+            hooks.append(slow_log.attach(conn))
+        if len(hooks) == 1:
+            conn.set_trace_callback(hooks[0])
+        elif hooks:
+            def trace(statement):
+                for hook in hooks:
+                    hook(statement)
+            conn.set_trace_callback(trace)
+
+    def acquire(self):
+        """取出一个连接，池中无空闲连接且已达上限时阻塞等待"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._connect()
+            except sqlite3.Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"等待数据库连接超时({self.timeout}秒)")
+
+    def release(self, conn):
+        """归还连接，未结束的事务会被回滚"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            self._discard(conn)
+
+    def _discard(self, conn):
+        """关闭并丢弃损坏或多余的连接"""
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_POOL_TIMEOUT, pragmas=None):
+    """获取数据库文件对应的进程级连接池
+
+    fork 出的子进程(如 gunicorn worker)不能复用父进程的连接，
+    检测到进程号变化时会重新建池。
+    """
+    key = os.path.abspath(database)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            pool = ConnectionPool(database, size, timeout, pragmas)
+            _pools[key] = pool
+        return pool
+
+
+def get_app_pool(config):
+    """按 Flask 配置获取连接池"""
+    return get_pool(
+        config['DATABASE'],
+        size=config.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE),
+        timeout=config.get('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT),
+        pragmas=config.get('DB_PRAGMAS'),
+    )
@@ -0,0 +1,172 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from app.models.db_pool import get_app_pool, get_pool
+from app.models.transactions import DEFAULT_WRITE_RETRIES, run_in_transaction
+from app.models.user_cache import get_user_cache
+
+DEFAULT_FLUSH_INTERVAL = 5.0    # 秒
+
+LAST_LOGIN_TABLES = {False: 'users', True: 'admin_users'}
+
+
+class LastLoginBuffer:
+    """最后登录时间的写回缓冲
+
+    登录时只在内存中记下时间，后台线程定期在一个事务里用 executemany 批量写入，
+    登录请求不再争用数据库写锁。同一用户在一个周期内多次登录只写最后一次。
+    """
+
+    def __init__(self, pool, interval=DEFAULT_FLUSH_INTERVAL, retries=DEFAULT_WRITE_RETRIES):
+        self.pool = pool
+        self.interval = interval
+        self.retries = retries
+        self.last_flush_at = None
+        self.total_written = 0
+        self.last_error = None
+        self.pid = None     # 启动写回线程的进程
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, username, is_admin=False):
+        """记下用户的登录时间，格式与 datetime('now') 相同(UTC)"""
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            self._pending[(bool(is_admin), username)] = now
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """写入全部待写的登录时间，返回写入条数；失败时放回缓冲等待下次写入"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        def write(cursor):
+            for is_admin, table in LAST_LOGIN_TABLES.items():
+                rows = [(login_at, username)
+                        for (admin, username), login_at in pending.items() if admin == is_admin]
+                if rows:
+                    cursor.executemany(f'''
+                    UPDATE {table}
+                    SET last_login = ?
+                    WHERE username = ?
+                    ''', rows)
+
+        conn = self.pool.acquire()
+        try:
+            run_in_transaction(conn, write, retries=self.retries)
+        except sqlite3.Error:
+            with self._lock:
+                # 缓冲中更新的登录时间优先
+                for key, login_at in pending.items():
+                    self._pending.setdefault(key, login_at)
+            raise
+        finally:
+            self.pool.release(conn)
+
+        # 缓存中的用户信息带着旧的登录时间
+        cache = get_user_cache(self.pool.database)
+        for is_admin, username in pending:
+            cache.invalidate(username, is_admin)
+        self.last_flush_at = time.time()
+        self.total_written += len(pending)
+        return len(pending)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+                self.last_error = None
+            except sqlite3.Error as e:
+                self.last_error = str(e)
+                print(f"写入最后登录时间失败: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='last-login-flusher',
+                                            daemon=True)
+            self._thread.start()
+
+    def ensure_started(self):
+        """确保当前进程中的写回线程在运行
+
+        fork 出的子进程没有父进程的线程，也不能复用父进程的连接，
+        改用本进程的连接池，丢弃继承来的待写记录(由父进程负责写入)并注册退出时写入。
+        """
+        if self.pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self.pid != os.getpid():
+                self.pool = get_pool(self.pool.database, self.pool.size, self.pool.timeout,
+                                     self.pool.pragmas)
+                self._pending = {}
+                self._stop = threading.Event()
+                self._thread = None
+                self.pid = os.getpid()
+                atexit.register(self.stop)
+            self.start()
+
+    def stop(self, flush=True):
+        """停止后台线程，flush 为 True 时写入剩余的登录时间"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + 1)
+        if flush:
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"写入最后登录时间失败: {e}")
+
+    def status(self):
+        return {
+            'interval': self.interval,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'pending': self.pending(),
+            'last_flush_at': self.last_flush_at,
+            'total_written': self.total_written,
+            'last_error': self.last_error,
+        }
+
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+def get_login_buffer(database):
+    """数据库对应的写回缓冲，未开启写回时为 None(同步更新)
+
+    fork 出的子进程首次使用时启动自己的写回线程。
+    """
+    buffer = _buffers.get(os.path.abspath(database))
+    if buffer is not None:
+        buffer.ensure_started()
+    return buffer
+
+
+def init_login_buffer(app):
+    """按 LAST_LOGIN_WRITE_BEHIND 开启最后登录时间的写回缓冲"""
+    if not app.config.get('LAST_LOGIN_WRITE_BEHIND', True):
+        return
+    key = os.path.abspath(app.config['DATABASE'])
+    buffer = LastLoginBuffer(
+        get_app_pool(app.config),
+        interval=app.config.get('LAST_LOGIN_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL),
+        retries=app.config.get('DB_WRITE_RETRIES', DEFAULT_WRITE_RETRIES),
+    )
+    with _buffers_lock:
+        previous = _buffers.get(key)
+        _buffers[key] = buffer
+    if previous is not None and previous.pid == os.getpid():
+        previous.stop()
+    buffer.ensure_started()
@@ -0,0 +1,46 @@
+import base64
+import binascii
+import json
+from collections import namedtuple
+
+# 每页默认行数与上限，可由 config.Config 覆盖
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# 一页结果：rows 为本页数据，next_token 为下一页的游标，没有下一页时为 None
+Page = namedtuple('Page', ('rows', 'next_token'))
+
+
+def clamp_page_size(limit, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """将请求的每页行数限制在 1 到 maximum 之间"""
+    if not limit or limit < 1:
+        return default
+    return min(limit, maximum)
+
+
+def encode_token(*values):
+    """把排序键编码为 URL 安全的游标"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_token(token, size):
+    """解析游标，格式不符时返回 None(从第一页开始)"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def make_page(rows, limit, key):
+    """由多取一行的查询结果构造 Page，key(row) 返回该行的排序键"""
+    if len(rows) <= limit:
+        return Page(rows, None)
+    rows = rows[:limit]
+    return Page(rows, encode_token(*key(rows[-1])))
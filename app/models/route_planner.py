@@ -0,0 +1,215 @@
+import os
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+
+MINUTES_PER_DAY = 24 * 60
+
+# 换乘参数默认值（分钟），可由 config.Config 覆盖
+DEFAULT_MIN_CONNECTION = 20
+DEFAULT_MAX_CONNECTION = 6 * 60
+DEFAULT_MAX_TRANSFERS = 2
+DEFAULT_RESULT_LIMIT = 20
+
+SORT_BY_DURATION = 'duration'
+SORT_BY_PRICE = 'price'
+
+# 行程中的一段：depart_at/arrive_at 为相对首段乘车日零点的分钟数，
+# day_offset 为该段乘车日期相对首段乘车日期的天数，
+# travel_date 和 available_seats 由 TicketSystem.plan_routes 按实际日期填写
+Leg = namedtuple('Leg', ('train', 'day_offset', 'depart_at', 'arrive_at',
+                         'travel_date', 'available_seats'))
+# 完整行程，total_minutes 从首段发车到末段到达
+Itinerary = namedtuple('Itinerary', ('legs', 'total_minutes', 'total_price', 'transfers'))
+
+
+def to_minute(time_str):
+    """HH:MM 转为当天第几分钟"""
+    return int(time_str[:2]) * 60 + int(time_str[3:5])
+
+
+class _Edge:
+    """图中的一条边：一个车次及其发车分钟和运行时长"""
+    __slots__ = ('minute', 'duration', 'train')
+
+    def __init__(self, train):
+        self.minute = to_minute(train.departure_time)
+        # 到达时间早于发车时间表示次日到达
+        self.duration = (to_minute(train.arrival_time) - self.minute) % MINUTES_PER_DAY
+        self.train = train
+
+    def __lt__(self, other):
+        return (self.minute, self.train.train_id) < (other.minute, other.train.train_id)
+
+
+class _Departures:
+    """某站(或某条线路)按发车分钟排序的车次
+
+    新增车次时整体替换 (minutes, edges)，并发查询总能读到一致的一对列表。
+    """
+    __slots__ = ('lists',)
+
+    def __init__(self):
+        self.lists = ((), ())
+
+    def add(self, edge):
+        minutes, edges = self.lists
+        i = bisect_left(edges, edge)
+        self.lists = (minutes[:i] + (edge.minute,) + minutes[i:],
+                      edges[:i] + (edge,) + edges[i:])
+
+    def between(self, earliest, latest):
+        """返回绝对发车时刻在 [earliest, latest] 内的 (发车时刻, 边)，可跨越多天"""
+        minutes, edges = self.lists
+        result = []
+        for day in range(earliest // MINUTES_PER_DAY, latest // MINUTES_PER_DAY + 1):
+            base = day * MINUTES_PER_DAY
+            lo = bisect_left(minutes, max(earliest - base, 0))
+            hi = bisect_left(minutes, min(latest - base, MINUTES_PER_DAY - 1) + 1)
+            result.extend((base + edge.minute, edge) for edge in edges[lo:hi])
+        return result
+
+
+class StationGraph:
+    """车站邻接索引
+
+    outgoing[站] 为从该站出发的全部车次，routes[(出发站, 目的站)] 为直达车次，
+    incoming[站] 为有车次直达该站的出发站集合，用于在搜索前剪枝。
+    """
+
+    def __init__(self, version=None, trains=()):
+        self.version = version
+        self.outgoing = {}
+        self.routes = {}
+        self.incoming = {}
+        for train in trains:
+            self.add(train)
+
+    def add(self, train):
+        """加入一个车次"""
+        edge = _Edge(train)
+        self.outgoing.setdefault(train.departure, _Departures()).add(edge)
+        self.routes.setdefault((train.departure, train.destination), _Departures()).add(edge)
+        self.incoming.setdefault(train.destination, set()).add(train.departure)
+
+    def _reaching(self, destination, hops):
+        """hops 段以内可到达目的站的车站"""
+        stations = set()
+        frontier = {destination}
+        for _ in range(hops):
+            frontier = set().union(*(self.incoming.get(s, ()) for s in frontier)) - stations
+            stations |= frontier
+        return stations
+
+    def plan(self, departure, destination, max_transfers=DEFAULT_MAX_TRANSFERS,
+             min_connection=DEFAULT_MIN_CONNECTION, max_connection=DEFAULT_MAX_CONNECTION,
+             from_minute=None, sort=SORT_BY_DURATION, limit=DEFAULT_RESULT_LIMIT):
+        """查询直达及最多 max_transfers 次换乘的行程
+
+        每次换乘至少留出 min_connection 分钟、最多等待 max_connection 分钟，
+        换乘可以跨天。from_minute 限定首段最早发车时刻。
+        按总历时(sort='duration')或总票价(sort='price')排序，返回前 limit 个行程。
+        """
+        if departure == destination or departure not in self.outgoing:
+            return []
+
+        # reach[k] 为最多再乘 k 段即可到达目的站的车站
+        reach = {k: self._reaching(destination, k) for k in range(1, max_transfers + 2)}
+        if departure not in reach[max_transfers + 1]:
+            return []
+
+        itineraries = []
+
+        def walk(station, legs, arrive_at, visited):
+            remaining = max_transfers + 1 - len(legs)
+            if legs:
+                earliest = arrive_at + min_connection
+                latest = arrive_at + max_connection
+            else:
+                earliest = from_minute or 0
+                latest = MINUTES_PER_DAY - 1
+
+            # 最后一段只需要查直达目的站的车次
+            if remaining == 1:
+                departures = self.routes.get((station, destination))
+            else:
+                departures = self.outgoing.get(station)
+            if departures is None:
+                return
+
+            for depart_at, edge in departures.between(earliest, latest):
+                next_station = edge.train.destination
+                if next_station in visited:
+                    continue
+                leg = Leg(edge.train, depart_at // MINUTES_PER_DAY, depart_at,
+                          depart_at + edge.duration, None, None)
+                if next_station == destination:
+                    itineraries.append(self._itinerary(legs + [leg]))
+                elif remaining > 1 and next_station in reach[remaining - 1]:
+                    walk(next_station, legs + [leg], leg.arrive_at, visited | {next_station})
+
+        walk(departure, [], None, {departure})
+
+        if sort == SORT_BY_PRICE:
+            key = lambda it: (it.total_price, it.total_minutes, it.transfers)
+        else:
+            key = lambda it: (it.total_minutes, it.transfers, it.total_price)
+        itineraries.sort(key=key)
+        return itineraries[:limit]
+
+    @staticmethod
+    def _itinerary(legs):
+        return Itinerary(
+            tuple(legs),
+            legs[-1].arrive_at - legs[0].depart_at,
+            round(sum(leg.train.price or 0 for leg in legs), 2),
+            len(legs) - 1,
+        )
+
+
+class RoutePlanner:
+    """按车次目录版本维护的进程内车站图
+
+    本进程添加车次时直接在图中插入一条边；其他情况(其他进程修改、改价)
+    发现目录版本号变化时由目录快照整体重建，不再查询数据库。
+    """
+
+    def __init__(self):
+        self._graph = StationGraph()
+        self._lock = threading.Lock()
+
+    def graph(self, catalog, get_conn):
+        """返回与车次目录当前版本一致的车站图"""
+        snapshot = catalog.snapshot(get_conn)
+        graph = self._graph
+        if graph.version == snapshot.version:
+            return graph
+        with self._lock:
+            if self._graph.version != snapshot.version:
+                self._graph = StationGraph(snapshot.version, snapshot.all.trains)
+            return self._graph
+
+    def add_train(self, train, version):
+        """增量加入新车次，version 为添加车次后的目录版本号
+
+        只有图恰好停在上一个版本时才能增量更新，否则留待下次查询时整体重建。
+        """
+        with self._lock:
+            graph = self._graph
+            if graph.version is not None and graph.version == version - 1:
+                graph.add(train)
+                graph.version = version
+
+
+_planners = {}
+_planners_lock = threading.Lock()
+
+
+def get_route_planner(database):
+    """获取数据库文件对应的换乘规划器"""
+    key = os.path.abspath(database)
+    with _planners_lock:
+        planner = _planners.get(key)
+        if planner is None:
+            planner = _planners[key] = RoutePlanner()
+        return planner
@@ -0,0 +1,360 @@
+import os
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# 进程内最多缓存的 (车次, 乘车日期) 位图数量
+CACHE_SIZE = 4096
+
+
+class SeatConflictError(sqlite3.DatabaseError):
+    """座位位图在读取后被其他连接修改"""
+
+
+class _Entry:
+    """缓存的车次座位位图"""
+    __slots__ = ('total_seats', 'sold_count', 'bits', 'stamp')
+
+    def __init__(self, total_seats, sold_count, bits, stamp):
+        self.total_seats = total_seats
+        self.sold_count = sold_count
+        self.bits = bits
+        self.stamp = stamp
+
+
+class SeatInventory:
+    """按 (车次, 乘车日期) 维护的座位占用位图
+
+    第 n 号座位对应位图的第 n-1 位，1 表示已售。位图持久化在 seat_inventory 表，
+    解码后的整数缓存在进程内；每次写入都会生成新的随机 stamp，
+    缓存的 stamp 与表中不一致(其他进程写过或事务被回滚)时重新读取。
+    """
+
+    def __init__(self, cache_size=CACHE_SIZE):
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _encode(bits, total_seats):
+        return bits.to_bytes((total_seats + 7) // 8, 'little')
+
+    @staticmethod
+    def _decode(blob):
+        return int.from_bytes(blob or b'', 'little')
+
+    def _build(self, cursor, train_id, travel_date):
+        """由 tickets 表重建某日车次位图(首次使用该日车次时)"""
+        cursor.execute('SELECT total_seats FROM trains WHERE train_id = ?', (train_id,))
+        train = cursor.fetchone()
+        if not train:
+            return None
+
+        total_seats = train[0]
+        cursor.execute('''
+        SELECT seat_number FROM tickets
+        WHERE train_id = ? AND travel_date = ? AND status = '已售'
+        ''', (train_id, travel_date))
+        bits = 0
+        for (seat_number,) in cursor.fetchall():
+            if seat_number and 1 <= seat_number <= total_seats:
+                bits |= 1 << (seat_number - 1)
+        return _Entry(total_seats, bin(bits).count('1'), bits, 0)
+
+    def _insert(self, cursor, train_id, travel_date, entry):
+        """写入新建的位图，已存在时返回 False"""
+        entry.stamp = secrets.randbits(62)
+        cursor.execute('''
+        INSERT OR IGNORE INTO seat_inventory
+        (train_id, travel_date, total_seats, sold_count, bitmap, stamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', (train_id, travel_date, entry.total_seats, entry.sold_count,
+              self._encode(entry.bits, entry.total_seats), entry.stamp))
+        return cursor.rowcount > 0
+
+    def _load(self, cursor, train_id, travel_date):
+        """读取某日车次位图，缓存有效时不读取 bitmap 列"""
+        key = (train_id, travel_date)
+        cursor.execute('''
+        SELECT total_seats, sold_count, stamp FROM seat_inventory
+        WHERE train_id = ? AND travel_date = ?
+        ''', key)
+        row = cursor.fetchone()
+
+        if row is None:
+            entry = self._build(cursor, train_id, travel_date)
+            if entry is None:
+                return None
+            if not self._insert(cursor, train_id, travel_date, entry):
+                # 其他连接已抢先建好，重新读取
+                return self._load(cursor, train_id, travel_date)
+            self._remember(key, entry)
+            return entry
+
+        total_seats, sold_count, stamp = row
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None and cached.stamp == stamp:
+            return cached
+
+        cursor.execute('''
+        SELECT bitmap FROM seat_inventory
+        WHERE train_id = ? AND travel_date = ?
+        ''', key)
+        entry = _Entry(total_seats, sold_count, self._decode(cursor.fetchone()[0]), stamp)
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def _store(self, cursor, train_id, travel_date, entry, bits, sold_count):
+        """写回位图，stamp 不一致说明位图已被并发修改"""
+        new_stamp = secrets.randbits(62)
+        cursor.execute('''
+        UPDATE seat_inventory
+        SET bitmap = ?, sold_count = ?, stamp = ?
+        WHERE train_id = ? AND travel_date = ? AND stamp = ?
+        ''', (self._encode(bits, entry.total_seats), sold_count, new_stamp,
+              train_id, travel_date, entry.stamp))
+        if cursor.rowcount == 0:
+            self.invalidate(train_id, travel_date)
+            raise SeatConflictError(f"车次 {train_id}({travel_date}) 座位数据已变更")
+        self._remember((train_id, travel_date),
+                       _Entry(entry.total_seats, sold_count, bits, new_stamp))
+
+    def allocate(self, cursor, train_id, travel_date):
+        """分配某日车次编号最小的空闲座位
+
+        返回座位号；车次不存在返回 None，无余票返回 0。
+        """
+        entry = self._load(cursor, train_id, travel_date)
+        if entry is None:
+            return None
+        if entry.sold_count >= entry.total_seats:
+            return 0
+
+        # ~bits & (bits + 1) 只保留最低位的 0
+        seat_number = (~entry.bits & (entry.bits + 1)).bit_length()
+        if seat_number > entry.total_seats:
+            return 0
+
+        self._store(cursor, train_id, travel_date, entry,
+                    entry.bits | (1 << (seat_number - 1)), entry.sold_count + 1)
+        return seat_number
+
+    def allocate_many(self, cursor, train_id, travel_date, count):
+        """一次分配 count 个座位，优先连号
+
+        先找能容纳全部乘客的最靠前的连续空座，找不到时从最长的空座段依次取用。
+        返回升序座位号列表；车次不存在返回 None，余票不足返回空列表(不分配任何座位)。
+        """
+        entry = self._load(cursor, train_id, travel_date)
+        if entry is None:
+            return None
+        if count <= 0 or entry.total_seats - entry.sold_count < count:
+            return []
+
+        # 收集所有空座段 (起始座位号, 长度)
+        runs = []
+        start = None
+        for seat_number in range(1, entry.total_seats + 2):
+            free = seat_number <= entry.total_seats and not entry.bits >> (seat_number - 1) & 1
+            if free and start is None:
+                start = seat_number
+            elif not free and start is not None:
+                runs.append((start, seat_number - start))
+                start = None
+
+        fitting = [run for run in runs if run[1] >= count]
+        if fitting:
+            first = fitting[0][0]
+            seats = list(range(first, first + count))
+        else:
+            seats = []
+            for first, length in sorted(runs, key=lambda run: (-run[1], run[0])):
+                take = min(length, count - len(seats))
+                seats.extend(range(first, first + take))
+                if len(seats) == count:
+                    break
+            seats.sort()
+
+        bits = entry.bits
+        for seat_number in seats:
+            bits |= 1 << (seat_number - 1)
+        self._store(cursor, train_id, travel_date, entry, bits, entry.sold_count + count)
+        return seats
+
+    def release(self, cursor, train_id, travel_date, seat_number):
+        """释放座位，座位号无效或未被占用时忽略"""
+        entry = self._load(cursor, train_id, travel_date)
+        if entry is None or not seat_number or not 1 <= seat_number <= entry.total_seats:
+            return
+        mask = 1 << (seat_number - 1)
+        if not entry.bits & mask:
+            return
+        self._store(cursor, train_id, travel_date, entry,
+                    entry.bits & ~mask, entry.sold_count - 1)
+
+    def rebuild_missing(self, cursor):
+        """为有已售车票但尚无位图的 (车次, 乘车日期) 补建位图"""
+        cursor.execute('''
+        SELECT DISTINCT t.train_id, t.travel_date
+        FROM tickets t
+        WHERE t.status = '已售' AND t.travel_date IS NOT NULL
+        AND NOT EXISTS (
+            SELECT 1 FROM seat_inventory s
+            WHERE s.train_id = t.train_id AND s.travel_date = t.travel_date
+        )
+        ''')
+        for train_id, travel_date in cursor.fetchall():
+            entry = self._build(cursor, train_id, travel_date)
+            if entry is not None:
+                self._insert(cursor, train_id, travel_date, entry)
+
+    def rebuild_all(self, cursor, chunk_size=10000):
+        """清空并按 tickets 表重建全部位图(批量导入后使用)
+
+        顺序扫描一遍已售车票，内存中只保留每个 (车次, 乘车日期) 的位图整数。
+        """
+        cursor.execute('DELETE FROM seat_inventory')
+        cursor.execute('SELECT train_id, total_seats FROM trains')
+        train_seats = dict(cursor.fetchall())
+
+        bitmaps = {}
+        cursor.execute('''
+        SELECT train_id, travel_date, seat_number FROM tickets NOT INDEXED
+        WHERE status = '已售' AND travel_date IS NOT NULL
+        ''')
+        while True:
+            batch = cursor.fetchmany(chunk_size)
+            if not batch:
+                break
+            for train_id, travel_date, seat_number in batch:
+                key = (train_id, travel_date)
+                bits = bitmaps.get(key, 0)
+                if seat_number and seat_number > 0:
+                    bits |= 1 << (seat_number - 1)
+                bitmaps[key] = bits
+
+        rows = []
+        for (train_id, travel_date), bits in bitmaps.items():
+            total_seats = train_seats.get(train_id)
+            if total_seats is None:
+                continue
+            bits &= (1 << total_seats) - 1
+            rows.append((train_id, travel_date, total_seats, bin(bits).count('1'),
+                         self._encode(bits, total_seats), secrets.randbits(62)))
+        cursor.executemany('''
+        INSERT INTO seat_inventory
+        (train_id, travel_date, total_seats, sold_count, bitmap, stamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        self.invalidate()
+
+    def verify(self, cursor, repair=False):
+        """用 tickets 表重新计算各日车次的已售座位，与位图逐一核对
+
+        返回不一致项列表；repair 为 True 时按 tickets 表改写位图和计数。
+        """
+        expected = {}
+        duplicates = {}
+        cursor.execute('''
+        SELECT train_id, travel_date, seat_number FROM tickets
+        WHERE status = '已售' AND travel_date IS NOT NULL
+        ''')
+        for train_id, travel_date, seat_number in cursor.fetchall():
+            key = (train_id, travel_date)
+            bits = expected.get(key, 0)
+            if seat_number and seat_number > 0:
+                mask = 1 << (seat_number - 1)
+                if bits & mask:
+                    duplicates.setdefault(key, []).append(seat_number)
+                bits |= mask
+            expected[key] = bits
+
+        cursor.execute('''
+        SELECT s.train_id, s.travel_date, s.total_seats, s.sold_count, s.bitmap,
+               tr.total_seats
+        FROM seat_inventory s
+        LEFT JOIN trains tr ON tr.train_id = s.train_id
+        ''')
+        stored = {(row[0], row[1]): row[2:] for row in cursor.fetchall()}
+
+        cursor.execute('SELECT train_id, total_seats FROM trains')
+        train_seats = dict(cursor.fetchall())
+
+        problems = []
+        for key in sorted(set(expected) | set(stored), key=lambda k: (k[0], k[1] or '')):
+            train_id, travel_date = key
+            bits = expected.get(key, 0)
+            total_seats = train_seats.get(train_id)
+            issues = []
+            if key in duplicates:
+                issues.append(f"重复座位 {sorted(set(duplicates[key]))}")
+            if total_seats is not None and bits >> total_seats:
+                issues.append("座位号超出总座位数")
+
+            if key not in stored:
+                if bits:
+                    issues.append("缺少位图")
+            else:
+                stored_total, sold_count, blob, _ = stored[key]
+                if total_seats is None:
+                    issues.append("车次不存在")
+                elif stored_total != total_seats:
+                    issues.append(f"总座位数 {stored_total} 应为 {total_seats}")
+                if sold_count != bin(bits).count('1'):
+                    issues.append(f"已售数 {sold_count} 应为 {bin(bits).count('1')}")
+                if self._decode(blob) != bits:
+                    issues.append("位图与车票不一致")
+
+            if issues:
+                problems.append({'train_id': train_id, 'travel_date': travel_date,
+                                 'issues': issues})
+                if repair and total_seats is not None:
+                    self._repair(cursor, train_id, travel_date, total_seats, bits)
+        return problems
+
+    def _repair(self, cursor, train_id, travel_date, total_seats, bits):
+        """按重新计算的结果改写位图"""
+        bits &= (1 << total_seats) - 1
+        cursor.execute('''
+        INSERT INTO seat_inventory
+        (train_id, travel_date, total_seats, sold_count, bitmap, stamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(train_id, travel_date) DO UPDATE SET
+            total_seats = excluded.total_seats,
+            sold_count = excluded.sold_count,
+            bitmap = excluded.bitmap,
+            stamp = excluded.stamp
+        ''', (train_id, travel_date, total_seats, bin(bits).count('1'),
+              self._encode(bits, total_seats), secrets.randbits(62)))
+        self.invalidate(train_id, travel_date)
+
+    def invalidate(self, train_id=None, travel_date=None):
+        """丢弃缓存的位图"""
+        with self._lock:
+            if train_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop((train_id, travel_date), None)
+
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+def get_seat_inventory(database):
+    """获取数据库文件对应的座位位图缓存"""
+    key = os.path.abspath(database)
+    with _inventories_lock:
+        inventory = _inventories.get(key)
+        if inventory is None:
+            inventory = _inventories[key] = SeatInventory()
+        return inventory
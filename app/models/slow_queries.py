@@ -0,0 +1,217 @@
+"""慢查询日志
+
+通过 sqlite3 的 trace 回调记录每条语句的开始时间，progress 回调在语句执行期间
+周期性检查耗时，超过阈值的语句连同参数、耗时和调用它的 TicketSystem 方法
+一起记录，同一语句(忽略参数值)首次变慢时另开只读连接抓取 EXPLAIN QUERY PLAN。
+
+耗时按语句开始到最后一次 progress 回调计算，边读取边处理结果的游标
+(如导出)会把读取方的处理时间也计算在内。默认关闭，由 SLOW_QUERY_LOG_ENABLED 开启。
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from app import metrics
+
+DEFAULT_THRESHOLD_MS = 100
+DEFAULT_LOG_SIZE = 200
+DEFAULT_PROGRESS_STEPS = 1000   # 每执行多少条虚拟机指令检查一次耗时
+
+# 语句中的字符串和数字字面量，用于提取参数并归并同一语句
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+# 18位身份证号
+_ID_NUMBER_RE = re.compile(r'\b(\d{6})\d{8}(\d{3}[\dXx])\b')
+
+
+def redact(text):
+    """隐去身份证号中间的出生日期"""
+    return _ID_NUMBER_RE.sub(r'\1********\2', text)
+
+
+def normalize(sql):
+    """将字面量替换为占位符，返回 (语句模板, 参数列表)"""
+    params = []
+
+    def replace(match):
+        literal = match.group(0)
+        if literal.startswith("'"):
+            params.append(literal[1:-1].replace("''", "'"))
+        else:
+            params.append(literal)
+        return '?'
+
+    template = _LITERAL_RE.sub(replace, sql)
+    return ' '.join(template.split()), params
+
+
+class SlowQuery:
+    """一次慢查询，语句执行期间耗时会持续更新"""
+
+    __slots__ = ('template', 'params', 'method', 'started_at', 'duration_ms')
+
+    def __init__(self, template, params, method, started_at, duration_ms):
+        self.template = template
+        self.params = params
+        self.method = method
+        self.started_at = started_at
+        self.duration_ms = duration_ms
+
+
+class _StatementStats:
+    """同一语句模板的累计情况"""
+
+    __slots__ = ('template', 'count', 'max_ms', 'methods', 'plan', 'full_scan')
+
+    def __init__(self, template):
+        self.template = template
+        self.count = 0
+        self.max_ms = 0.0
+        self.methods = set()
+        self.plan = None
+        self.full_scan = False
+
+
+class _ConnectionTracer:
+    """单个连接上当前语句的计时状态，连接同一时间只被一个线程使用"""
+
+    __slots__ = ('log', 'conn', 'sql', 'started', 'entry')
+
+    def __init__(self, log, conn):
+        self.log = log
+        self.conn = conn
+        self.sql = None
+        self.started = 0.0
+        self.entry = None
+
+    def trace(self, sql):
+        # 触发器和 FTS 内部语句计入外层语句：前者以外层语句的形式重复回调，
+        # 后者以 -- 开头
+        if sql.startswith('--') or (sql == self.sql and self.conn.in_transaction):
+            return
+        self.sql = sql
+        self.started = time.perf_counter()
+        self.entry = None
+
+    def progress(self):
+        elapsed = time.perf_counter() - self.started
+        if elapsed >= self.log.threshold and self.sql is not None:
+            if self.entry is None:
+                self.entry = self.log.record(self.sql, elapsed)
+            else:
+                self.entry.duration_ms = elapsed * 1000
+                self.log.update(self.entry)
+        return 0
+
+
+class SlowQueryLog:
+    """进程内的慢查询记录，保留最近的若干条"""
+
+    def __init__(self, database, threshold_ms=DEFAULT_THRESHOLD_MS,
+                 size=DEFAULT_LOG_SIZE, progress_steps=DEFAULT_PROGRESS_STEPS):
+        self.database = database
+        self.enabled = False
+        self.configure(threshold_ms, size, progress_steps)
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    def configure(self, threshold_ms=DEFAULT_THRESHOLD_MS, size=DEFAULT_LOG_SIZE,
+                  progress_steps=DEFAULT_PROGRESS_STEPS):
+        self.threshold = threshold_ms / 1000
+        self.progress_steps = progress_steps
+        self._entries = deque(maxlen=size)
+
+    def attach(self, conn):
+        """在连接上安装 progress 回调，返回供 trace 回调调用的函数"""
+        tracer = _ConnectionTracer(self, conn)
+        conn.set_progress_handler(tracer.progress, self.progress_steps)
+        return tracer.trace
+
+    def record(self, sql, elapsed):
+        """记录新出现的慢查询，首次出现的语句抓取执行计划"""
+        template, params = normalize(sql)
+        entry = SlowQuery(template, [redact(p) for p in params], metrics.current_method(),
+                          datetime.now().strftime('%Y-%m-%d %H:%M:%S'), elapsed * 1000)
+        with self._lock:
+            self._entries.append(entry)
+            stats = self._statements.get(template)
+            is_new = stats is None
+            if is_new:
+                stats = self._statements[template] = _StatementStats(template)
+            stats.count += 1
+            stats.methods.add(entry.method)
+            stats.max_ms = max(stats.max_ms, entry.duration_ms)
+        if is_new:
+            stats.plan = self._explain(sql)
+            stats.full_scan = any(
+                detail.startswith('SCAN') and 'USING' not in detail
+                for detail in stats.plan)
+        print(f"慢查询 {entry.duration_ms:.0f}ms [{entry.method}] {redact(' '.join(sql.split()))}")
+        return entry
+
+    def update(self, entry):
+        with self._lock:
+            stats = self._statements.get(entry.template)
+            if stats is not None:
+                stats.max_ms = max(stats.max_ms, entry.duration_ms)
+
+    def _explain(self, sql):
+        """在只读连接上执行 EXPLAIN QUERY PLAN，不影响原连接上的事务"""
+        try:
+            uri = Path(self.database).absolute().as_uri() + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True)
+            try:
+                rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            return [f'无法获取执行计划: {e}']
+        return [row[3] for row in rows]
+
+    def entries(self):
+        """最近的慢查询，最新的在前"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def statements(self):
+        """按最大耗时排序的语句汇总"""
+        with self._lock:
+            stats = list(self._statements.values())
+        return sorted(stats, key=lambda s: s.max_ms, reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._statements.clear()
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_slow_query_log(database):
+    """获取数据库文件对应的进程级慢查询日志"""
+    key = os.path.abspath(database)
+    with _logs_lock:
+        log = _logs.get(key)
+        if log is None:
+            log = _logs[key] = SlowQueryLog(database)
+        return log
+
+
+def init_slow_query_log(app):
+    """按配置开启慢查询日志，需在打开数据库连接之前调用"""
+    if not app.config.get('SLOW_QUERY_LOG_ENABLED', False):
+        return
+    log = get_slow_query_log(app.config['DATABASE'])
+    log.configure(
+        threshold_ms=app.config.get('SLOW_QUERY_THRESHOLD_MS', DEFAULT_THRESHOLD_MS),
+        size=app.config.get('SLOW_QUERY_LOG_SIZE', DEFAULT_LOG_SIZE),
+        progress_steps=app.config.get('SLOW_QUERY_PROGRESS_STEPS', DEFAULT_PROGRESS_STEPS),
+    )
+    log.enabled = True
+    metrics.enable_tracking()
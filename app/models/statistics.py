@@ -0,0 +1,473 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+from app.models.db_pool import get_app_pool, get_pool
+from app.models.transactions import run_in_transaction
+
+STATISTICS_MODE_TRIGGER = 'trigger'   # 售票/退票时由触发器同步更新统计表
+STATISTICS_MODE_EVENTS = 'events'     # 售票/退票时只记录事件，由后台线程批量汇总
+
+# 后台汇总默认参数，可由 config.Config 覆盖
+DEFAULT_FLUSH_INTERVAL = 5.0    # 秒
+DEFAULT_BATCH_SIZE = 5000       # 每个事务最多汇总的事件数
+
+# 同步模式：每次售票在订票事务内更新日/月/年统计
+SYNC_TRIGGERS = {
+    'update_statistics_after_sale': '''
+    CREATE TRIGGER IF NOT EXISTS update_statistics_after_sale
+    AFTER INSERT ON tickets
+    WHEN NEW.status = '已售'
+    BEGIN
+        -- 更新每日统计
+        INSERT OR REPLACE INTO daily_statistics 
+        (date, tickets_sold, total_revenue, created_at, updated_at)
+        VALUES (
+            date(NEW.booking_time),
+            COALESCE((SELECT tickets_sold FROM daily_statistics 
+                      WHERE date = date(NEW.booking_time)), 0) + 1,
+            COALESCE((SELECT total_revenue FROM daily_statistics 
+                      WHERE date = date(NEW.booking_time)), 0) + 
+            (SELECT price FROM trains WHERE train_id = NEW.train_id),
+            COALESCE((SELECT created_at FROM daily_statistics 
+                      WHERE date = date(NEW.booking_time)), 
+                     datetime('now')),
+            datetime('now')
+        );
+
+        -- 更新月度统计
+        INSERT OR REPLACE INTO monthly_statistics 
+        (year_month, tickets_sold, total_revenue, created_at, updated_at)
+        VALUES (
+            strftime('%Y-%m', NEW.booking_time),
+            COALESCE((SELECT tickets_sold FROM monthly_statistics 
+                      WHERE year_month = strftime('%Y-%m', NEW.booking_time)), 0) + 1,
+            COALESCE((SELECT total_revenue FROM monthly_statistics 
+                      WHERE year_month = strftime('%Y-%m', NEW.booking_time)), 0) + 
+            (SELECT price FROM trains WHERE train_id = NEW.train_id),
+            COALESCE((SELECT created_at FROM monthly_statistics 
+                      WHERE year_month = strftime('%Y-%m', NEW.booking_time)), 
+                     datetime('now')),
+            datetime('now')
+        );
+
+        -- 更新年度统计
+        INSERT OR REPLACE INTO yearly_statistics 
+        (year, tickets_sold, total_revenue, created_at, updated_at)
+        VALUES (
+            strftime('%Y', NEW.booking_time),
+            COALESCE((SELECT tickets_sold FROM yearly_statistics 
+                      WHERE year = strftime('%Y', NEW.booking_time)), 0) + 1,
+            COALESCE((SELECT total_revenue FROM yearly_statistics 
+                      WHERE year = strftime('%Y', NEW.booking_time)), 0) + 
+            (SELECT price FROM trains WHERE train_id = NEW.train_id),
+            COALESCE((SELECT created_at FROM yearly_statistics 
+                      WHERE year = strftime('%Y', NEW.booking_time)), 
+                     datetime('now')),
+            datetime('now')
+        );
+    END;
+    ''',
+    'update_statistics_after_refund': '''
+    CREATE TRIGGER IF NOT EXISTS update_statistics_after_refund
+    AFTER UPDATE ON tickets
+    WHEN NEW.status = '已退' AND OLD.status = '已售'
+    BEGIN
+        -- 更新每日统计
+        UPDATE daily_statistics 
+        SET tickets_refunded = COALESCE(tickets_refunded, 0) + 1,
+            total_refund = COALESCE(total_refund, 0) + 
+                          (SELECT price FROM trains WHERE train_id = NEW.train_id),
+            updated_at = datetime('now')
+        WHERE date = date(NEW.booking_time);
+
+        -- 更新月度统计
+        UPDATE monthly_statistics 
+        SET tickets_refunded = COALESCE(tickets_refunded, 0) + 1,
+            total_refund = COALESCE(total_refund, 0) + 
+                          (SELECT price FROM trains WHERE train_id = NEW.train_id),
+            updated_at = datetime('now')
+        WHERE year_month = strftime('%Y-%m', NEW.booking_time);
+
+        -- 更新年度统计
+        UPDATE yearly_statistics 
+        SET tickets_refunded = COALESCE(tickets_refunded, 0) + 1,
+            total_refund = COALESCE(total_refund, 0) + 
+                          (SELECT price FROM trains WHERE train_id = NEW.train_id),
+            updated_at = datetime('now')
+        WHERE year = strftime('%Y', NEW.booking_time);
+    END;
+    ''',
+}
+
+# 事件模式：每次售票/退票只追加一行事件
+EVENT_TRIGGERS = {
+    'record_sale_event': '''
+    CREATE TRIGGER IF NOT EXISTS record_sale_event
+    AFTER INSERT ON tickets
+    WHEN NEW.status = '已售'
+    BEGIN
+        INSERT INTO sales_events (stat_date, kind, amount, created_at)
+        VALUES (
+            date(NEW.booking_time), 1,
+            (SELECT price FROM trains WHERE train_id = NEW.train_id),
+            (julianday('now') - 2440587.5) * 86400.0
+        );
+    END;
+    ''',
+    'record_refund_event': '''
+    CREATE TRIGGER IF NOT EXISTS record_refund_event
+    AFTER UPDATE ON tickets
+    WHEN NEW.status = '已退' AND OLD.status = '已售'
+    BEGIN
+        INSERT INTO sales_events (stat_date, kind, amount, created_at)
+        VALUES (
+            date(NEW.booking_time), -1,
+            (SELECT price FROM trains WHERE train_id = NEW.train_id),
+            (julianday('now') - 2440587.5) * 86400.0
+        );
+    END;
+    ''',
+}
+
+# 按 (订票日期, 车次) 的销售表，两种统计模式下都在订票/退票事务内同步更新。
+# 每行只被当天该车次的订单更新，不会像日统计表那样成为所有订票争用的热点行
+TRAIN_DAILY_SALES_TRIGGERS = {
+    'update_train_daily_sales_after_sale': '''
+    CREATE TRIGGER IF NOT EXISTS update_train_daily_sales_after_sale
+    AFTER INSERT ON tickets
+    WHEN NEW.status = '已售' AND NEW.booking_time IS NOT NULL
+    BEGIN
+        INSERT INTO train_daily_sales
+        (sale_date, train_id, tickets_sold, tickets_refunded, total_revenue, total_refund)
+        VALUES (
+            date(NEW.booking_time), NEW.train_id, 1, 0,
+            COALESCE((SELECT price FROM trains WHERE train_id = NEW.train_id), 0), 0
+        )
+        ON CONFLICT(sale_date, train_id) DO UPDATE SET
+            tickets_sold = tickets_sold + 1,
+            total_revenue = total_revenue + excluded.total_revenue;
+    END;
+    ''',
+    'update_train_daily_sales_after_refund': '''
+    CREATE TRIGGER IF NOT EXISTS update_train_daily_sales_after_refund
+    AFTER UPDATE ON tickets
+    WHEN NEW.status = '已退' AND OLD.status = '已售'
+    BEGIN
+        UPDATE train_daily_sales
+        SET tickets_refunded = tickets_refunded + 1,
+            total_refund = total_refund +
+                           COALESCE((SELECT price FROM trains WHERE train_id = NEW.train_id), 0)
+        WHERE sale_date = date(NEW.booking_time) AND train_id = NEW.train_id;
+    END;
+    ''',
+}
+
+# 统计表及其主键列
+ROLLUP_TABLES = (
+    ('daily_statistics', 'date', 10),
+    ('monthly_statistics', 'year_month', 7),
+    ('yearly_statistics', 'year', 4),
+)
+
+
+def install_statistics_triggers(cursor, mode):
+    """按统计模式安装对应的触发器并删除另一组，返回是否有改动"""
+    if mode == STATISTICS_MODE_EVENTS:
+        wanted, unwanted = EVENT_TRIGGERS, SYNC_TRIGGERS
+    else:
+        wanted, unwanted = SYNC_TRIGGERS, EVENT_TRIGGERS
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    existing = {row[0] for row in cursor.fetchall()}
+
+    changed = False
+    for name in unwanted:
+        if name in existing:
+            cursor.execute(f'DROP TRIGGER {name}')
+            changed = True
+    for name, sql in wanted.items():
+        if name not in existing:
+            cursor.execute(sql)
+            changed = True
+    return changed
+
+
+def install_train_daily_sales_triggers(cursor):
+    """安装按车次和日期的销售表触发器"""
+    for sql in TRAIN_DAILY_SALES_TRIGGERS.values():
+        cursor.execute(sql)
+
+
+def rebuild_train_daily_sales(cursor):
+    """按 tickets 表重新计算按车次和日期的销售表，口径与日统计表相同"""
+    cursor.execute('DELETE FROM train_daily_sales')
+    cursor.execute('''
+    INSERT INTO train_daily_sales
+    (sale_date, train_id, tickets_sold, tickets_refunded, total_revenue, total_refund)
+    SELECT t.booking_date, t.train_id,
+           COUNT(*),
+           SUM(t.status = '已退'),
+           SUM(tr.price),
+           SUM(CASE WHEN t.status = '已退' THEN tr.price ELSE 0 END)
+    FROM tickets t
+    JOIN trains tr ON tr.train_id = t.train_id
+    WHERE t.status IN ('已售', '已退') AND t.booking_time IS NOT NULL
+    GROUP BY t.booking_date, t.train_id
+    ''')
+
+
+def rebuild_statistics(cursor):
+    """按 tickets 表重新计算日/月/年统计表及按车次的日销售表，并清空待汇总的事件
+
+    与触发器口径一致：按订票日期归类，退票同时计入售票数和退票数。
+    按车次的日销售表扫描一次 tickets，日/月/年统计都由它汇总。
+    """
+    cursor.execute('DELETE FROM sales_events')
+    for table, _, _ in ROLLUP_TABLES:
+        cursor.execute(f'DELETE FROM {table}')
+
+    rebuild_train_daily_sales(cursor)
+
+    daily_table, daily_key, _ = ROLLUP_TABLES[0]
+    cursor.execute(f'''
+    INSERT INTO {daily_table}
+    ({daily_key}, tickets_sold, tickets_refunded, total_revenue, total_refund,
+     created_at, updated_at)
+    SELECT sale_date,
+           SUM(tickets_sold), SUM(tickets_refunded),
+           SUM(total_revenue), SUM(total_refund),
+           datetime('now'), datetime('now')
+    FROM train_daily_sales
+    GROUP BY sale_date
+    ''')
+
+    for table, key_column, length in ROLLUP_TABLES[1:]:
+        cursor.execute(f'''
+        INSERT INTO {table}
+        ({key_column}, tickets_sold, tickets_refunded, total_revenue, total_refund,
+         created_at, updated_at)
+        SELECT substr({daily_key}, 1, {length}),
+               SUM(tickets_sold), SUM(tickets_refunded),
+               SUM(total_revenue), SUM(total_refund),
+               datetime('now'), datetime('now')
+        FROM {daily_table}
+        GROUP BY substr({daily_key}, 1, {length})
+        ''')
+
+
+def fold_events(cursor, batch_size=DEFAULT_BATCH_SIZE):
+    """将最早的一批销售事件汇总进日/月/年统计表并删除，返回汇总的事件数"""
+    cursor.execute('''
+    SELECT event_id, stat_date, kind, amount FROM sales_events
+    ORDER BY event_id LIMIT ?
+    ''', (batch_size,))
+    events = cursor.fetchall()
+    if not events:
+        return 0
+
+    # 每个统计键: [售票数, 退票数, 收入, 退款]
+    buckets = {table: {} for table, _, _ in ROLLUP_TABLES}
+    for _, stat_date, kind, amount in events:
+        if not stat_date:
+            continue
+        for table, _, length in ROLLUP_TABLES:
+            bucket = buckets[table].setdefault(stat_date[:length], [0, 0, 0.0, 0.0])
+            if kind > 0:
+                bucket[0] += 1
+                bucket[2] += amount or 0
+            else:
+                bucket[1] += 1
+                bucket[3] += amount or 0
+
+    for table, key_column, _ in ROLLUP_TABLES:
+        cursor.executemany(f'''
+        INSERT INTO {table}
+        ({key_column}, tickets_sold, tickets_refunded, total_revenue, total_refund,
+         created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+        ON CONFLICT({key_column}) DO UPDATE SET
+            tickets_sold = COALESCE(tickets_sold, 0) + excluded.tickets_sold,
+            tickets_refunded = COALESCE(tickets_refunded, 0) + excluded.tickets_refunded,
+            total_revenue = COALESCE(total_revenue, 0) + excluded.total_revenue,
+            total_refund = COALESCE(total_refund, 0) + excluded.total_refund,
+            updated_at = excluded.updated_at
+        ''', [(key, *values) for key, values in buckets[table].items()])
+
+    cursor.execute('DELETE FROM sales_events WHERE event_id <= ?', (events[-1][0],))
+    return len(events)
+
+
+def statistics_lag(cursor):
+    """待汇总事件数及最早事件已等待的秒数"""
+    cursor.execute('''
+    SELECT COUNT(*), MIN(created_at),
+           (julianday('now') - 2440587.5) * 86400.0
+    FROM sales_events
+    ''')
+    pending, oldest, now = cursor.fetchone()
+    return {
+        'pending_events': pending,
+        'lag_seconds': round(now - oldest, 3) if oldest is not None else 0.0,
+    }
+
+
+class StatisticsAggregator:
+    """后台汇总线程，定期把销售事件批量写入统计表
+
+    线程按进程启动(见 ensure_started)：gunicorn --preload 等先建应用再 fork 的服务器中，
+    worker 不会继承主进程的线程，由各自的第一个请求启动自己的汇总线程。
+    """
+
+    def __init__(self, pool, interval=DEFAULT_FLUSH_INTERVAL,
+                 batch_size=DEFAULT_BATCH_SIZE, retries=5):
+        self.pool = pool
+        self.interval = interval
+        self.batch_size = batch_size
+        self.retries = retries
+        self.last_run_at = None
+        self.last_folded = 0
+        self.total_folded = 0
+        self.last_error = None
+        self.pid = None     # 启动汇总线程的进程
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def run_once(self):
+        """汇总全部待处理事件，返回本次汇总的事件数"""
+        folded = 0
+        conn = self.pool.acquire()
+        try:
+            while True:
+                count = run_in_transaction(
+                    conn, lambda cursor: fold_events(cursor, self.batch_size),
+                    retries=self.retries
+                )
+                folded += count
+                if count < self.batch_size:
+                    break
+        finally:
+            self.pool.release(conn)
+        self.last_run_at = time.time()
+        self.last_folded = folded
+        self.total_folded += folded
+        return folded
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+                self.last_error = None
+            except sqlite3.Error as e:
+                self.last_error = str(e)
+                print(f"汇总统计数据失败: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='statistics-aggregator',
+                                            daemon=True)
+            self._thread.start()
+
+    def ensure_started(self):
+        """确保当前进程中的汇总线程在运行
+
+        fork 出的子进程不能复用父进程的连接，改用本进程的连接池并注册退出时汇总。
+        """
+        if self.pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self.pid != os.getpid():
+                self.pool = get_pool(self.pool.database, self.pool.size, self.pool.timeout,
+                                     self.pool.pragmas)
+                self._stop = threading.Event()
+                self._thread = None
+                self.pid = os.getpid()
+                atexit.register(self.stop)
+            self.start()
+
+    def stop(self, flush=True):
+        """停止后台线程，flush 为 True 时汇总剩余事件"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + 1)
+        if flush:
+            try:
+                self.run_once()
+            except sqlite3.Error as e:
+                print(f"汇总统计数据失败: {e}")
+
+    def status(self):
+        return {
+            'interval': self.interval,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'last_run_at': self.last_run_at,
+            'last_folded': self.last_folded,
+            'total_folded': self.total_folded,
+            'last_error': self.last_error,
+        }
+
+
+_aggregator = None
+
+
+def get_aggregator():
+    """本进程的后台汇总线程，同步模式下为 None；进程中首次调用时启动线程"""
+    if _aggregator is not None:
+        _aggregator.ensure_started()
+    return _aggregator
+
+
+def _start_aggregator():
+    get_aggregator()
+
+
+def init_statistics(app):
+    """按 STATISTICS_MODE 切换触发器，事件模式下启动后台汇总线程
+
+    切回同步模式时，先把遗留的事件汇总完，避免统计数据丢失。
+    数据库尚未建表时跳过，由 create_tables 安装触发器。
+    fork 出的子进程在处理第一个请求时启动自己的汇总线程。
+    """
+    global _aggregator
+    mode = app.config.get('STATISTICS_MODE', STATISTICS_MODE_TRIGGER)
+    pool = get_app_pool(app.config)
+    retries = app.config.get('DB_WRITE_RETRIES', 5)
+
+    conn = pool.acquire()
+    try:
+        row = conn.execute('''
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'table' AND name IN ('tickets', 'sales_events')
+        ''').fetchone()
+        if row[0] < 2:
+            return
+        run_in_transaction(conn, lambda cursor: install_statistics_triggers(cursor, mode),
+                           retries=retries)
+    except sqlite3.Error as e:
+        print(f"初始化统计模式失败: {e}")
+        return
+    finally:
+        pool.release(conn)
+
+    aggregator = StatisticsAggregator(
+        pool,
+        interval=app.config.get('STATISTICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL),
+        batch_size=app.config.get('STATISTICS_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+        retries=retries,
+    )
+    if mode != STATISTICS_MODE_EVENTS:
+        try:
+            aggregator.run_once()
+        except sqlite3.Error as e:
+            print(f"汇总遗留统计事件失败: {e}")
+        return
+
+    if _aggregator is not None and _aggregator.pid == os.getpid():
+        _aggregator.stop(flush=False)
+    _aggregator = aggregator
+    _aggregator.ensure_started()
+    app.before_request(_start_aggregator)
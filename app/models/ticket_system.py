@@ -1,23 +1,185 @@
 import sqlite3
-from datetime import datetime
-from flask import g
+from datetime import date, datetime, timedelta
+from app import metrics
+from app.models.dashboard import (
+    DEFAULT_MAX_AGE as DEFAULT_DASHBOARD_MAX_AGE, Dashboard, DailySales, get_dashboard_snapshot
+)
+from app.models.db_pool import get_pool
+from app.models.login_buffer import get_login_buffer
+from app.models.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, Page, clamp_page_size, decode_token, make_page
+)
+from app.models.route_planner import (
+    DEFAULT_MAX_CONNECTION, DEFAULT_MAX_TRANSFERS, DEFAULT_MIN_CONNECTION,
+    SORT_BY_DURATION, get_route_planner
+)
+from app.models.seat_inventory import get_seat_inventory
+from app.models.statistics import (
+    STATISTICS_MODE_TRIGGER, install_statistics_triggers, install_train_daily_sales_triggers,
+    rebuild_train_daily_sales, statistics_lag
+)
+from app.models.train_catalog import (
+    DEFAULT_CHECK_INTERVAL, TRAIN_COLUMNS, AvailableTrain, Train, get_train_catalog
+)
+from app.models.transactions import (
+    DEFAULT_WRITE_RETRIES, is_busy_error, run_in_transaction
+)
+from app.models.user_cache import DEFAULT_MAX_SIZE, DEFAULT_TTL, get_user_cache
+from app.models.write_queue import get_write_queue
 
+# 导出时每次从游标读取的行数
+EXPORT_CHUNK_SIZE = 1000
+
+# 由 HH:MM 格式的发车时间计算当天第几分钟
+DEPARTURE_MINUTE_SQL = ("CAST(substr(departure_time, 1, 2) AS INTEGER) * 60"
+                        " + CAST(substr(departure_time, 4, 2) AS INTEGER)")
+
+# trigram 分词至少需要3个字符，更短的姓名按前缀查询
+FTS_MIN_QUERY_LENGTH = 3
+
+# 各数据库是否建有姓名全文索引
+_name_index_available = {}
+
+# 销售报表读取按车次和日期的销售表，扫描的行数只与日期范围内的车次数有关
+SALES_REPORT_SQL = '''
+SELECT s.train_id, 
+       SUM(s.tickets_sold - s.tickets_refunded) as tickets_sold,
+       SUM(s.total_revenue - s.total_refund) as total_amount
+FROM train_daily_sales s
+WHERE s.sale_date BETWEEN ? AND ?
+GROUP BY s.train_id
+HAVING SUM(s.tickets_sold - s.tickets_refunded) > 0
+'''
+
+# 分页的销售报表，按车次号翻页
+SALES_REPORT_PAGE_SQL = '''
+SELECT s.train_id, 
+       SUM(s.tickets_sold - s.tickets_refunded) as tickets_sold,
+       SUM(s.total_revenue - s.total_refund) as total_amount
+FROM train_daily_sales s
+WHERE s.sale_date BETWEEN ? AND ?
+AND s.train_id > ?
+GROUP BY s.train_id
+HAVING SUM(s.tickets_sold - s.tickets_refunded) > 0
+ORDER BY s.train_id
+LIMIT ?
+'''
+
+# 各统计周期对应的表和主键列
+STATISTICS_TABLES = {
+    'daily': ('daily_statistics', 'date'),
+    'monthly': ('monthly_statistics', 'year_month'),
+    'yearly': ('yearly_statistics', 'year'),
+}
+
+@metrics.instrument
 class TicketSystem:
-    def __init__(self, database):
+    def __init__(self, database, pool=None, config=None):
         self.database = database
+        self.config = config or {}
+        self.pool = pool if pool is not None else get_pool(database)
+        self._conn = None
+        self.seats = get_seat_inventory(database)
+        self.catalog = get_train_catalog(
+            database,
+            self.config.get('TRAIN_CACHE_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+        )
+        self.planner = get_route_planner(database)
+        self.user_cache = get_user_cache(
+            database,
+            ttl=self.config.get('USER_CACHE_TTL', DEFAULT_TTL),
+            max_size=self.config.get('USER_CACHE_SIZE', DEFAULT_MAX_SIZE)
+        )
+        self.dashboard = get_dashboard_snapshot(
+            database,
+            max_age=self.config.get('DASHBOARD_MAX_AGE', DEFAULT_DASHBOARD_MAX_AGE)
+        )
+        self.write_retries = self.config.get('DB_WRITE_RETRIES', DEFAULT_WRITE_RETRIES)
+        self.page_size = self.config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE)
+        self.max_page_size = self.config.get('MAX_PAGE_SIZE', MAX_PAGE_SIZE)
 
     def get_db(self):
-        """获取数据库连接"""
-        if 'db' not in g:
-            g.db = sqlite3.connect(self.database)
-            g.db.row_factory = sqlite3.Row
-        return g.db
+        """从连接池取出数据库连接，同一实例内复用"""
+        if self._conn is None:
+            self._conn = self.pool.acquire()
+        return self._conn
 
     def close_db(self):
-        """关闭数据库连接"""
-        db = g.pop('db', None)
-        if db is not None:
-            db.close()
+        """将数据库连接归还连接池"""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self.pool.release(conn)
+
+    def _page_size(self, limit):
+        return clamp_page_size(limit, self.page_size, self.max_page_size)
+
+    def _write(self, func):
+        """在带重试的 BEGIN IMMEDIATE 事务中执行 func(cursor)
+
+        开启单写线程时交给写线程与其他写请求合并提交，否则在本连接上直接执行。
+        """
+        write_queue = get_write_queue(self.database)
+        if write_queue is not None:
+            return write_queue.run(func)
+        return run_in_transaction(self.get_db(), func, retries=self.write_retries)
+
+    @staticmethod
+    def _ensure_column(cursor, table, column, definition):
+        """为已有数据库补充新增的列"""
+        cursor.execute(f'PRAGMA table_xinfo({table})')
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            return True
+        return False
+
+    def _create_name_index(self, cursor):
+        """创建乘客姓名 FTS5 trigram 索引，SQLite 不支持时退回普通索引"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'tickets_name_fts'")
+        exists = cursor.fetchone() is not None
+        try:
+            cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS tickets_name_fts USING fts5(
+                passenger_name,
+                content = 'tickets',
+                content_rowid = 'ticket_id',
+                tokenize = 'trigram'
+            )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"创建姓名全文索引失败，姓名查询将使用普通索引: {e}")
+            _name_index_available[self.database] = False
+            return
+        
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS tickets_name_fts_insert
+        AFTER INSERT ON tickets
+        BEGIN
+            INSERT INTO tickets_name_fts (rowid, passenger_name)
+            VALUES (NEW.ticket_id, NEW.passenger_name);
+        END;
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS tickets_name_fts_delete
+        AFTER DELETE ON tickets
+        BEGIN
+            INSERT INTO tickets_name_fts (tickets_name_fts, rowid, passenger_name)
+            VALUES ('delete', OLD.ticket_id, OLD.passenger_name);
+        END;
+        ''')
+        
+        # 新建的索引需要为已有订单补建
+        if not exists:
+            cursor.execute("INSERT INTO tickets_name_fts (tickets_name_fts) VALUES ('rebuild')")
+        _name_index_available[self.database] = True
+
+    def _has_name_index(self):
+        """当前数据库是否建有姓名全文索引"""
+        available = _name_index_available.get(self.database)
+        if available is None:
+            cursor = self.get_db().cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'tickets_name_fts'")
+            available = _name_index_available[self.database] = cursor.fetchone() is not None
+        return available
 
     def create_tables(self):
         """创建所需的表、索引和视图"""
@@ -25,7 +187,7 @@ class TicketSystem:
         cursor = db.cursor()
         
         # 创建车次信息表
-        cursor.execute('''
+        cursor.execute(f'''
         CREATE TABLE IF NOT EXISTS trains (
             train_id TEXT PRIMARY KEY,     -- 车次编号
             departure TEXT,                -- 出发站
@@ -33,7 +195,26 @@ class TicketSystem:
             departure_time TEXT,           -- 发车时间
             arrival_time TEXT,             -- 到达时间
             total_seats INTEGER,           -- 总座位数
-            price REAL                     -- 票价
+            price REAL,                    -- 票价
+            departure_minute INTEGER GENERATED ALWAYS AS ({DEPARTURE_MINUTE_SQL}) VIRTUAL  -- 发车时刻(当天第几分钟)
+        )
+        ''')
+        
+        # 旧库补充发车分钟列，由 departure_time 生成，无需回填
+        self._ensure_column(cursor, 'trains', 'departure_minute',
+                            f'INTEGER GENERATED ALWAYS AS ({DEPARTURE_MINUTE_SQL}) VIRTUAL')
+        
+        # 按线路和发车时段查询车次
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_trains_route_minute
+        ON trains(departure, destination, departure_minute)
+        ''')
+        
+        # 创建缓存版本表，修改车次时递增，用于通知其他进程刷新缓存
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,         -- 缓存名称
+            version INTEGER                -- 版本号
         )
         ''')
         
@@ -59,14 +240,28 @@ class TicketSystem:
             booking_time TEXT,             -- 订票时间
             status TEXT,                   -- 票状态(已售/已退)
             is_group BOOLEAN,              -- 是否团体票
+            travel_date TEXT,              -- 乘车日期(YYYY-MM-DD)
+            booking_date TEXT GENERATED ALWAYS AS (date(booking_time)) VIRTUAL,  -- 订票日期
             FOREIGN KEY (train_id) REFERENCES trains(train_id)
         )
         ''')
         
-        # 创建订单查询索引
+        # 旧库补充乘车日期，历史订单按订票当天乘车处理
+        if self._ensure_column(cursor, 'tickets', 'travel_date', 'TEXT'):
+            cursor.execute('''
+            UPDATE tickets SET travel_date = date(booking_time)
+            WHERE travel_date IS NULL
+            ''')
+        
+        # 旧库补充订票日期列，由 booking_time 生成，无需回填
+        self._ensure_column(cursor, 'tickets', 'booking_date',
+                            'TEXT GENERATED ALWAYS AS (date(booking_time)) VIRTUAL')
+        
+        # 创建订单查询索引，按 (订票时间, 车票号) 翻页时无需排序
+        cursor.execute('DROP INDEX IF EXISTS idx_tickets_passenger')
         cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_tickets_passenger 
-        ON tickets(passenger_id)
+        CREATE INDEX IF NOT EXISTS idx_tickets_passenger_time
+        ON tickets(passenger_id, booking_time)
         ''')
         
         cursor.execute('''
@@ -74,25 +269,85 @@ class TicketSystem:
         ON tickets(train_id)
         ''')
         
-        # 创建销售统计视图
         cursor.execute('''
-        CREATE VIEW IF NOT EXISTS sales_summary AS
+        CREATE INDEX IF NOT EXISTS idx_tickets_name
+        ON tickets(passenger_name)
+        ''')
+        
+        # 创建乘客姓名全文索引(trigram)，由触发器随订单写入同步
+        self._create_name_index(cursor)
+        
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tickets_train_date
+        ON tickets(train_id, travel_date)
+        ''')
+        
+        # 按订票日期范围统计的索引
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tickets_status_booking_date
+        ON tickets(status, booking_date, train_id)
+        ''')
+        
+        # 旧版位图按车次整体计数，不区分乘车日期，丢弃后按日重建
+        cursor.execute('PRAGMA table_info(seat_inventory)')
+        columns = [row[1] for row in cursor.fetchall()]
+        if columns and 'travel_date' not in columns:
+            cursor.execute('DROP TABLE seat_inventory')
+            self.seats.invalidate()
+        
+        # 创建座位占用位图表(按车次和乘车日期)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS seat_inventory (
+            train_id TEXT,                 -- 车次编号
+            travel_date TEXT,              -- 乘车日期(YYYY-MM-DD)
+            total_seats INTEGER,           -- 总座位数
+            sold_count INTEGER,            -- 已售座位数
+            bitmap BLOB,                   -- 座位占用位图(第n位对应n+1号座)
+            stamp INTEGER,                 -- 写入版本，用于校验进程内缓存
+            PRIMARY KEY (train_id, travel_date),
+            FOREIGN KEY (train_id) REFERENCES trains(train_id)
+        )
+        ''')
+        
+        # 创建按车次和订票日期的销售表，由触发器随订票/退票同步更新
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'train_daily_sales'")
+        train_daily_sales_exists = cursor.fetchone() is not None
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS train_daily_sales (
+            sale_date TEXT NOT NULL,                   -- 订票日期
+            train_id TEXT NOT NULL,                    -- 车次编号
+            tickets_sold INTEGER NOT NULL DEFAULT 0,   -- 售票数量(含之后退掉的)
+            tickets_refunded INTEGER NOT NULL DEFAULT 0,  -- 退票数量
+            total_revenue REAL NOT NULL DEFAULT 0,     -- 售票金额
+            total_refund REAL NOT NULL DEFAULT 0,      -- 退票金额
+            PRIMARY KEY (sale_date, train_id)
+        ) WITHOUT ROWID
+        ''')
+        
+        # 旧库按已有订单补齐
+        if not train_daily_sales_exists:
+            rebuild_train_daily_sales(cursor)
+        
+        # 创建销售统计视图(售出未退的票数和金额)
+        cursor.execute('DROP VIEW IF EXISTS sales_summary')
+        cursor.execute('''
+        CREATE VIEW sales_summary AS
         SELECT 
-            t.train_id,
+            s.train_id,
             tr.departure,
             tr.destination,
-            COUNT(*) as tickets_sold,
-            SUM(tr.price) as total_revenue,
-            date(t.booking_time) as sale_date
-        FROM tickets t
-        JOIN trains tr ON t.train_id = tr.train_id
-        WHERE t.status = '已售'
-        GROUP BY t.train_id, date(t.booking_time)
+            s.tickets_sold - s.tickets_refunded as tickets_sold,
+            s.total_revenue - s.total_refund as total_revenue,
+            s.sale_date
+        FROM train_daily_sales s
+        JOIN trains tr ON s.train_id = tr.train_id
+        WHERE s.tickets_sold > s.tickets_refunded
         ''')
         
-        # 创建余票查询视图
+        # 创建余票查询视图(按乘车日期，没有记录的日期表示尚未售票)
+        cursor.execute('DROP VIEW IF EXISTS available_tickets')
         cursor.execute('''
-        CREATE VIEW IF NOT EXISTS available_tickets AS
+        CREATE VIEW available_tickets AS
         SELECT 
             t.train_id,
             t.departure,
@@ -101,13 +356,10 @@ class TicketSystem:
             t.arrival_time,
             t.total_seats,
             t.price,
-            t.total_seats - (
-                SELECT COUNT(*) 
-                FROM tickets tk 
-                WHERE tk.train_id = t.train_id 
-                AND tk.status = '已售'
-            ) as available_seats
+            s.travel_date,
+            t.total_seats - s.sold_count as available_seats
         FROM trains t
+        JOIN seat_inventory s ON s.train_id = t.train_id
         ''')
         
         # 创建每日统计表
@@ -155,6 +407,17 @@ class TicketSystem:
         )
         ''')
         
+        # 创建销售事件表(事件模式下由后台线程汇总进统计表)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_events (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stat_date TEXT,                  -- 统计日期(订票日期)
+            kind INTEGER,                    -- 1 售出 / -1 退票
+            amount REAL,                     -- 票价
+            created_at REAL                  -- 记录时间(Unix 时间戳)
+        )
+        ''')
+        
         # 创建管理员账户表
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS admin_users (
@@ -197,93 +460,11 @@ class TicketSystem:
         except sqlite3.Error as e:
             print(f"创建管理员账户失败: {e}")
 
-        # 添加统计更新触发器
-        cursor.execute('''
-        CREATE TRIGGER IF NOT EXISTS update_statistics_after_sale
-        AFTER INSERT ON tickets
-        WHEN NEW.status = '已售'
-        BEGIN
-            -- 更新每日统计
-            INSERT OR REPLACE INTO daily_statistics 
-            (date, tickets_sold, total_revenue, created_at, updated_at)
-            VALUES (
-                date(NEW.booking_time),
-                COALESCE((SELECT tickets_sold FROM daily_statistics 
-                          WHERE date = date(NEW.booking_time)), 0) + 1,
-                COALESCE((SELECT total_revenue FROM daily_statistics 
-                          WHERE date = date(NEW.booking_time)), 0) + 
-                (SELECT price FROM trains WHERE train_id = NEW.train_id),
-                COALESCE((SELECT created_at FROM daily_statistics 
-                          WHERE date = date(NEW.booking_time)), 
-                         datetime('now')),
-                datetime('now')
-            );
-            
-            -- 更新月度统计
-            INSERT OR REPLACE INTO monthly_statistics 
-            (year_month, tickets_sold, total_revenue, created_at, updated_at)
-            VALUES (
-                strftime('%Y-%m', NEW.booking_time),
-                COALESCE((SELECT tickets_sold FROM monthly_statistics 
-                          WHERE year_month = strftime('%Y-%m', NEW.booking_time)), 0) + 1,
-                COALESCE((SELECT total_revenue FROM monthly_statistics 
-                          WHERE year_month = strftime('%Y-%m', NEW.booking_time)), 0) + 
-                (SELECT price FROM trains WHERE train_id = NEW.train_id),
-                COALESCE((SELECT created_at FROM monthly_statistics 
-                          WHERE year_month = strftime('%Y-%m', NEW.booking_time)), 
-                         datetime('now')),
-                datetime('now')
-            );
-            
-            -- 更新年度统计
-            INSERT OR REPLACE INTO yearly_statistics 
-            (year, tickets_sold, total_revenue, created_at, updated_at)
-            VALUES (
-                strftime('%Y', NEW.booking_time),
-                COALESCE((SELECT tickets_sold FROM yearly_statistics 
-                          WHERE year = strftime('%Y', NEW.booking_time)), 0) + 1,
-                COALESCE((SELECT total_revenue FROM yearly_statistics 
-                          WHERE year = strftime('%Y', NEW.booking_time)), 0) + 
-                (SELECT price FROM trains WHERE train_id = NEW.train_id),
-                COALESCE((SELECT created_at FROM yearly_statistics 
-                          WHERE year = strftime('%Y', NEW.booking_time)), 
-                         datetime('now')),
-                datetime('now')
-            );
-        END;
-        ''')
-        
-        # 添加退票统计触发器
-        cursor.execute('''
-        CREATE TRIGGER IF NOT EXISTS update_statistics_after_refund
-        AFTER UPDATE ON tickets
-        WHEN NEW.status = '已退' AND OLD.status = '已售'
-        BEGIN
-            -- 更新每日统计
-            UPDATE daily_statistics 
-            SET tickets_refunded = COALESCE(tickets_refunded, 0) + 1,
-                total_refund = COALESCE(total_refund, 0) + 
-                              (SELECT price FROM trains WHERE train_id = NEW.train_id),
-                updated_at = datetime('now')
-            WHERE date = date(NEW.booking_time);
-            
-            -- 更新月度统计
-            UPDATE monthly_statistics 
-            SET tickets_refunded = COALESCE(tickets_refunded, 0) + 1,
-                total_refund = COALESCE(total_refund, 0) + 
-                              (SELECT price FROM trains WHERE train_id = NEW.train_id),
-                updated_at = datetime('now')
-            WHERE year_month = strftime('%Y-%m', NEW.booking_time);
-            
-            -- 更新年度统计
-            UPDATE yearly_statistics 
-            SET tickets_refunded = COALESCE(tickets_refunded, 0) + 1,
-                total_refund = COALESCE(total_refund, 0) + 
-                              (SELECT price FROM trains WHERE train_id = NEW.train_id),
-                updated_at = datetime('now')
-            WHERE year = strftime('%Y', NEW.booking_time);
-        END;
-        ''')
+        # 添加统计更新触发器(同步更新统计表，或只记录销售事件由后台汇总)
+        install_statistics_triggers(
+            cursor, self.config.get('STATISTICS_MODE', STATISTICS_MODE_TRIGGER)
+        )
+        install_train_daily_sales_triggers(cursor)
         
         # 添加测试数据
         try:
@@ -328,22 +509,22 @@ class TicketSystem:
             
             # 添加测试订单数据
             test_tickets = [
-                ('G100', '张三', '110101199001011234', 1, '2024-01-01 08:00:00', '已售', False),
-                ('G100', '李四', '110101199001011235', 2, '2024-01-01 08:05:00', '已售', False),
-                ('G200', '王五', '110101199001011236', 1, '2024-01-01 09:00:00', '已售', False),
-                ('G200', '赵六', '110101199001011237', 2, '2024-01-01 09:10:00', '已退', False),
-                ('D100', '张三', '110101199001011234', 5, '2024-01-02 10:00:00', '已售', False),
-                ('G300', '李四', '110101199001011235', 8, '2024-01-02 08:30:00', '已售', False),
-                ('G101', '王五', '110101199001011236', 12, '2024-01-02 09:00:00', '已退', False),
-                ('D200', '赵六', '110101199001011237', 15, '2024-01-03 08:30:00', '已售', False),
-                ('G400', '张三', '110101199001011234', 20, '2024-01-03 10:00:00', '已售', False),
-                ('K200', '李四', '110101199001011235', 25, '2024-01-03 19:00:00', '已售', False)
+                ('G100', '张三', '110101199001011234', 1, '2024-01-01 08:00:00', '已售', False, '2024-01-01'),
+                ('G100', '李四', '110101199001011235', 2, '2024-01-01 08:05:00', '已售', False, '2024-01-01'),
+                ('G200', '王五', '110101199001011236', 1, '2024-01-01 09:00:00', '已售', False, '2024-01-01'),
+                ('G200', '赵六', '110101199001011237', 2, '2024-01-01 09:10:00', '已退', False, '2024-01-01'),
+                ('D100', '张三', '110101199001011234', 5, '2024-01-02 10:00:00', '已售', False, '2024-01-02'),
+                ('G300', '李四', '110101199001011235', 8, '2024-01-02 08:30:00', '已售', False, '2024-01-02'),
+                ('G101', '王五', '110101199001011236', 12, '2024-01-02 09:00:00', '已退', False, '2024-01-02'),
+                ('D200', '赵六', '110101199001011237', 15, '2024-01-03 08:30:00', '已售', False, '2024-01-03'),
+                ('G400', '张三', '110101199001011234', 20, '2024-01-03 10:00:00', '已售', False, '2024-01-03'),
+                ('K200', '李四', '110101199001011235', 25, '2024-01-03 19:00:00', '已售', False, '2024-01-03')
             ]
             cursor.executemany('''
             INSERT OR IGNORE INTO tickets 
             (train_id, passenger_name, passenger_id, seat_number, booking_time, 
-             status, is_group)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+             status, is_group, travel_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', test_tickets)
             
             # 添加管理员账���
@@ -355,7 +536,14 @@ class TicketSystem:
             ('manager', 'manager123', '销售经理', '13900000001', 'manager@system.com', datetime('now'), 'active')
             ''')
             
+            # 为已有订单建立座位位图
+            self.seats.rebuild_missing(cursor)
+            
+            # 车次数据可能已变化，通知所有进程刷新车次缓存
+            self.catalog.bump_version(cursor)
+            
             db.commit()
+            self.catalog.invalidate()
             print("测试数据添加成功")
             
         except sqlite3.Error as e:
@@ -364,138 +552,287 @@ class TicketSystem:
     def add_train(self, train_id, departure, destination, departure_time, 
                   arrival_time, total_seats, price):
         """添加新车次"""
-        try:
-            db = self.get_db()
-            cursor = db.cursor()
+        def add(cursor):
             cursor.execute('''
-            INSERT INTO trains VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO trains 
+            (train_id, departure, destination, departure_time, arrival_time, 
+             total_seats, price)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (train_id, departure, destination, departure_time, 
                  arrival_time, total_seats, price))
-            db.commit()
+            version = self.catalog.bump_version(cursor)
+            cursor.execute(f'''
+            SELECT {', '.join(TRAIN_COLUMNS)} FROM trains WHERE train_id = ?
+            ''', (train_id,))
+            return Train(*cursor.fetchone()), version
+
+        try:
+            train, version = self._write(add)
+            self.catalog.invalidate()
+            # 换乘图直接插入新车次，无需整体重建
+            self.planner.add_train(train, version)
             return True
         except sqlite3.Error as e:
             print(f"添加车次失败: {e}")
             return False
 
-    def search_trains(self, departure=None, destination=None):
-        """查询车次"""
-        query = "SELECT * FROM trains WHERE 1=1"
-        params = []
+    def search_trains(self, departure=None, destination=None, travel_date=None,
+                      from_minute=None, to_minute=None):
+        """查询车次
         
-        if departure:
-            query += " AND departure = ?"
-            params.append(departure)
-        if destination:
-            query += " AND destination = ?"
-            params.append(destination)
-            
+        车次信息来自进程内缓存，按发车时间排序；from_minute/to_minute 限定发车时段
+        [from_minute, to_minute)，单位为当天第几分钟。指定 travel_date 时附加当日余票
+        available_seats，余票随订票实时变化，按 (车次, 日期) 主键读取
+        """
         try:
-            db = self.get_db()
-            cursor = db.cursor()
-            cursor.execute(query, params)
-            return cursor.fetchall()
+            trains = self.catalog.search(self.get_db, departure, destination,
+                                         from_minute, to_minute)
+            if not travel_date or not trains:
+                return trains
+            
+            sold = self._sold_counts(travel_date, [train.train_id for train in trains])
+            return [AvailableTrain(*train, train.total_seats - sold.get(train.train_id, 0))
+                    for train in trains]
         except sqlite3.Error as e:
             print(f"查询失败: {e}")
             return []
 
-    def book_ticket(self, train_id, passenger_name, passenger_id, is_group=False):
-        """订票功能"""
+    def _sold_counts(self, travel_date, train_ids):
+        """按 (车次, 日期) 主键批量读取已售座位数，返回 {车次: 已售数}"""
+        cursor = self.get_db().cursor()
+        sold = {}
+        for i in range(0, len(train_ids), 500):
+            chunk = train_ids[i:i + 500]
+            cursor.execute(f'''
+            SELECT train_id, sold_count FROM seat_inventory
+            WHERE travel_date = ? AND train_id IN ({', '.join('?' * len(chunk))})
+            ''', [travel_date] + chunk)
+            sold.update(cursor.fetchall())
+        return sold
+
+    def plan_routes(self, departure, destination, travel_date=None, sort=SORT_BY_DURATION,
+                    max_transfers=None, from_minute=None):
+        """查询直达及换乘行程
+
+        在进程内车站图上搜索，不对 trains 表做自连接；换乘时间限制取自配置。
+        返回 Itinerary 列表，每段附带实际乘车日期和当日余票。
+        """
+        travel_date = travel_date or date.today().strftime('%Y-%m-%d')
+        if max_transfers is None:
+            max_transfers = self.config.get('ROUTE_MAX_TRANSFERS', DEFAULT_MAX_TRANSFERS)
         try:
-            # 检查余票
-            db = self.get_db()
-            cursor = db.cursor()
-            cursor.execute('''
-            SELECT total_seats, 
-                   (SELECT COUNT(*) FROM tickets 
-                    WHERE train_id = ? AND status = '已售') as sold_seats 
-            FROM trains WHERE train_id = ?
-            ''', (train_id, train_id))
-            
-            result = cursor.fetchone()
-            if not result:
+            graph = self.planner.graph(self.catalog, self.get_db)
+            itineraries = graph.plan(
+                departure, destination,
+                max_transfers=max_transfers,
+                min_connection=self.config.get('ROUTE_MIN_CONNECTION_MINUTES',
+                                               DEFAULT_MIN_CONNECTION),
+                max_connection=self.config.get('ROUTE_MAX_CONNECTION_MINUTES',
+                                               DEFAULT_MAX_CONNECTION),
+                from_minute=from_minute,
+                sort=sort,
+            )
+
+            # 各段的实际乘车日期，按日期分组读取余票
+            first_day = datetime.strptime(travel_date, '%Y-%m-%d').date()
+            leg_date = lambda leg: (first_day + timedelta(days=leg.day_offset)).strftime('%Y-%m-%d')
+            trains_by_date = {}
+            for itinerary in itineraries:
+                for leg in itinerary.legs:
+                    trains_by_date.setdefault(leg_date(leg), set()).add(leg.train.train_id)
+            sold = {day: self._sold_counts(day, sorted(train_ids))
+                    for day, train_ids in trains_by_date.items()}
+
+            result = []
+            for itinerary in itineraries:
+                legs = tuple(
+                    leg._replace(travel_date=leg_date(leg),
+                                 available_seats=leg.train.total_seats
+                                 - sold[leg_date(leg)].get(leg.train.train_id, 0))
+                    for leg in itinerary.legs
+                )
+                result.append(itinerary._replace(legs=legs))
+            return result
+        except (sqlite3.Error, ValueError) as e:
+            print(f"换乘查询失败: {e}")
+            return []
+
+    def book_ticket(self, train_id, passenger_name, passenger_id, is_group=False,
+                    travel_date=None):
+        """订票功能，未指定乘车日期时默认当天"""
+        travel_date = travel_date or date.today().strftime('%Y-%m-%d')
+        booking_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        price = 0.0
+        
+        def book(cursor):
+            nonlocal price
+            # 从当日座位位图分配座位号
+            seat_number = self.seats.allocate(cursor, train_id, travel_date)
+            if seat_number is None:
                 return False, "车次不存在"
-                
-            total_seats, sold_seats = result
-            if sold_seats >= total_seats:
+            if not seat_number:
                 return False, "无余票"
-            
-            # 分配座位号
-            seat_number = sold_seats + 1
+            price = self._train_price(cursor, train_id)
             
             # 创建订单
             cursor.execute('''
             INSERT INTO tickets 
             (train_id, passenger_name, passenger_id, seat_number, 
-             booking_time, status, is_group)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+             booking_time, status, is_group, travel_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (train_id, passenger_name, passenger_id, seat_number,
-                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'), '已售', is_group))
-            
-            db.commit()
-            return True, f"订票成功，座位号: {seat_number}"
-            
+                 booking_time, '已售', is_group, travel_date))
+            return True, f"订票成功，乘车日期: {travel_date}，座位号: {seat_number}"
+        
+        try:
+            with self.dashboard.change() as sold:
+                result = self._write(book)
+                if result[0]:
+                    sold.add(booking_time[:10], train_id, 1, price)
+            return result
         except sqlite3.Error as e:
             print(f"订票失败: {e}")
+            if is_busy_error(e):
+                return False, "系统繁忙，请稍后重试"
             return False, "订票失败"
 
+    @staticmethod
+    def _train_price(cursor, train_id):
+        """车次当前票价，与销售统计触发器计入的金额一致"""
+        cursor.execute('SELECT price FROM trains WHERE train_id = ?', (train_id,))
+        row = cursor.fetchone()
+        return (row[0] or 0.0) if row else 0.0
+
+    @staticmethod
+    def _format_seats(seats):
+        """将座位号列表压缩为 1-3, 7 的形式"""
+        parts = []
+        start = prev = seats[0]
+        for seat_number in seats[1:] + [None]:
+            if seat_number is not None and seat_number == prev + 1:
+                prev = seat_number
+                continue
+            parts.append(str(start) if start == prev else f"{start}-{prev}")
+            start = prev = seat_number
+        return ', '.join(parts)
+
+    def book_group(self, train_id, passengers, travel_date=None):
+        """团体订票
+        
+        passengers: [(乘客姓名, 身份证号), ...]
+        所有乘客在同一事务中出票，余票不足时整单失败
+        """
+        travel_date = travel_date or date.today().strftime('%Y-%m-%d')
+        passengers = list(passengers)
+        if not passengers:
+            return False, "没有乘客信息"
+        
+        booking_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        price = 0.0
+        
+        def book(cursor):
+            nonlocal price
+            seats = self.seats.allocate_many(cursor, train_id, travel_date, len(passengers))
+            if seats is None:
+                return False, "车次不存在"
+            if not seats:
+                return False, f"余票不足，无法为 {len(passengers)} 位乘客订票"
+            price = self._train_price(cursor, train_id)
+            
+            cursor.executemany('''
+            INSERT INTO tickets 
+            (train_id, passenger_name, passenger_id, seat_number, 
+             booking_time, status, is_group, travel_date)
+            VALUES (?, ?, ?, ?, ?, '已售', 1, ?)
+            ''', [(train_id, name, id_number, seat_number, booking_time, travel_date)
+                  for (name, id_number), seat_number in zip(passengers, seats)])
+            return True, (f"团体订票成功，共 {len(seats)} 张，乘车日期: {travel_date}，"
+                          f"座位号: {self._format_seats(seats)}")
+        
+        try:
+            with self.dashboard.change() as sold:
+                result = self._write(book)
+                if result[0]:
+                    sold.add(booking_time[:10], train_id, len(passengers),
+                             price * len(passengers))
+            return result
+        except sqlite3.Error as e:
+            print(f"团体订票失败: {e}")
+            if is_busy_error(e):
+                return False, "系统繁忙，请稍后重试"
+            return False, "团体订票失败"
+
     def refund_ticket(self, ticket_id):
         """退票功能"""
-        try:
-            db = self.get_db()
-            cursor = db.cursor()
+        ticket = None
+        price = 0.0
+        
+        def refund(cursor):
+            nonlocal ticket, price
             cursor.execute('''
-            UPDATE tickets SET status = '已退' 
+            SELECT train_id, travel_date, seat_number, booking_date FROM tickets
             WHERE ticket_id = ? AND status = '已售'
             ''', (ticket_id,))
+            ticket = cursor.fetchone()
+            if not ticket:
+                return False, "退票失败，票不存在或已退"
+            price = self._train_price(cursor, ticket['train_id'])
             
-            if cursor.rowcount > 0:
-                db.commit()
-                return True, "退票成功"
-            return False, "退票失败，票不存在或已退"
+            cursor.execute('''
+            UPDATE tickets SET status = '已退' 
+            WHERE ticket_id = ? AND status = '已售'
+            ''', (ticket_id,))
             
+            # 释放座位供再次出售
+            self.seats.release(cursor, ticket['train_id'], ticket['travel_date'],
+                               ticket['seat_number'])
+            return True, "退票成功"
+        
+        try:
+            with self.dashboard.change() as sold:
+                result = self._write(refund)
+                if result[0]:
+                    sold.add(ticket['booking_date'], ticket['train_id'], -1, -price)
+            return result
         except sqlite3.Error as e:
             print(f"退票失败: {e}")
+            if is_busy_error(e):
+                return False, "系统繁忙，请稍后重试"
             return False, "退票失败"
 
     def update_train_price(self, train_id, new_price):
         """更新票价"""
-        try:
-            db = self.get_db()
-            cursor = db.cursor()
+        def update(cursor):
             cursor.execute('''
             UPDATE trains SET price = ? WHERE train_id = ?
             ''', (new_price, train_id))
             
             if cursor.rowcount > 0:
-                db.commit()
+                self.catalog.bump_version(cursor)
                 return True, "票价更新成功"
             return False, "更新失败，车次不存在"
-            
+        
+        try:
+            result = self._write(update)
+            self.catalog.invalidate()
+            return result
         except sqlite3.Error as e:
             print(f"更新票价失败: {e}")
             return False, "更新票价失败"
 
-    def generate_sales_report(self, start_date, end_date):
-        """生成销售报表"""
+    def generate_sales_report(self, start_date, end_date, limit=None, after=None):
+        """生成销售报表，按车次号分页，返回 Page"""
+        limit = self._page_size(limit)
+        after = decode_token(after, 1) or ['']
         try:
             db = self.get_db()
             cursor = db.cursor()
-            cursor.execute('''
-            SELECT t.train_id, 
-                   COUNT(*) as tickets_sold,
-                   SUM(tr.price) as total_amount
-            FROM tickets t
-            JOIN trains tr ON t.train_id = tr.train_id
-            WHERE t.status = '已售'
-            AND date(t.booking_time) BETWEEN ? AND ?
-            GROUP BY t.train_id
-            ''', (start_date, end_date))
-            
-            return cursor.fetchall()
+            cursor.execute(SALES_REPORT_PAGE_SQL, (start_date, end_date, after[0], limit + 1))
+            return make_page(cursor.fetchall(), limit, lambda row: (row[0],))
             
         except sqlite3.Error as e:
             print(f"生成报表失败: {e}")
-            return []
+            return Page([], None)
 
     def authenticate_user(self, username, password, is_admin=False):
         """验证用户登录"""
@@ -523,7 +860,12 @@ class TicketSystem:
                 if user[2] != 'active':
                     return None
                 
-                # 更新最后登录时间
+                # 更新最后登录时间：开启写回时由后台线程批量写入
+                buffer = get_login_buffer(self.database)
+                if buffer is not None:
+                    buffer.record(username, is_admin)
+                    return user
+                
                 table = 'admin_users' if is_admin else 'users'
                 cursor.execute(f'''
                 UPDATE {table}
@@ -531,6 +873,9 @@ class TicketSystem:
                 WHERE username = ?
                 ''', (username,))
                 db.commit()
+                
+                # 登录后重新读取用户信息(含最后登录时间)
+                self.user_cache.invalidate(username, is_admin)
             
             return user
             
@@ -540,19 +885,17 @@ class TicketSystem:
 
     def register_user(self, username, password, real_name, id_number, phone=None, email=None):
         """注册新用户"""
-        try:
-            db = self.get_db()
-            cursor = db.cursor()
-            
+        def register(cursor):
             # 添加 created_at 和 status 字段
             cursor.execute('''
             INSERT INTO users 
             (username, password, real_name, id_number, phone, email, created_at, status)
             VALUES (?, ?, ?, ?, ?, ?, datetime('now'), 'active')
             ''', (username, password, real_name, id_number, phone, email))
-            
-            db.commit()
             return True, "注册成功"
+        
+        try:
+            return self._write(register)
             
         except sqlite3.IntegrityError as e:
             if 'username' in str(e):
@@ -562,10 +905,17 @@ class TicketSystem:
             return False, "注册失败"
         except sqlite3.Error as e:
             print(f"注册用户失败: {e}")
+            if is_busy_error(e):
+                return False, "系统繁忙，请稍后重试"
             return False, "注册失败"
 
     def get_user_info(self, username, is_admin=False):
-        """获取用户信息"""
+        """获取用户信息，经由进程内缓存"""
+        return self.user_cache.get(username, is_admin,
+                                   lambda: self._load_user_info(username, is_admin))
+
+    def _load_user_info(self, username, is_admin=False):
+        """从数据库读取用户信息"""
         try:
             db = self.get_db()
             cursor = db.cursor()
@@ -589,30 +939,30 @@ class TicketSystem:
 
     def update_user_info(self, username, data, is_admin=False):
         """更新用户信息"""
-        try:
-            db = self.get_db()
-            cursor = db.cursor()
-            
-            fields = []
-            values = []
-            for key, value in data.items():
-                if value is not None:
-                    fields.append(f"{key} = ?")
-                    values.append(value)
-            
-            if not fields:
-                return False, "没有要更新的数据"
-            
-            values.append(username)
-            table = 'admin_users' if is_admin else 'users'
-            query = f'''
-            UPDATE {table}
-            SET {', '.join(fields)}
-            WHERE username = ?
-            '''
-            
+        fields = []
+        values = []
+        for key, value in data.items():
+            if value is not None:
+                fields.append(f"{key} = ?")
+                values.append(value)
+        
+        if not fields:
+            return False, "没有要更新的数据"
+        
+        values.append(username)
+        table = 'admin_users' if is_admin else 'users'
+        query = f'''
+        UPDATE {table}
+        SET {', '.join(fields)}
+        WHERE username = ?
+        '''
+        
+        def update(cursor):
             cursor.execute(query, values)
-            db.commit()
+        
+        try:
+            self._write(update)
+            self.user_cache.invalidate(username, is_admin)
             
             return True, "更新成功"
             
@@ -645,34 +995,92 @@ class TicketSystem:
             db = self.get_db()
             cursor = db.cursor()
             cursor.execute('''
-            SELECT * FROM sales_summary
+            SELECT train_id, departure, destination, tickets_sold, total_revenue, sale_date
+            FROM sales_summary
             WHERE sale_date = ?
+            ORDER BY train_id
             ''', (date,))
             return cursor.fetchall()
         except sqlite3.Error as e:
             print(f"查询失败: {e}")
             return []
 
+    def get_dashboard(self):
+        """管理员概览：今日各车次售票数、收入与座位数
+
+        售票数和金额来自进程内快照(见 DashboardSnapshot)，车次信息来自车次目录缓存，
+        刷新页面不再读取数据库。
+        """
+        today = date.today().strftime('%Y-%m-%d')
+        try:
+            sold, built_at = self.dashboard.sales(today, self._train_sales_on)
+            trains = self.catalog.snapshot(self.get_db).all.trains
+        except sqlite3.Error as e:
+            print(f"查询失败: {e}")
+            return Dashboard(today, [], 0, 0, 0, 0.0, None)
+        
+        sales = [DailySales(train.train_id, train.departure, train.destination,
+                            *sold[train.train_id], today, train.total_seats)
+                 for train in trains if train.train_id in sold]
+        return Dashboard(
+            date=today,
+            sales=sales,
+            train_count=len(trains),
+            total_seats=sum(train.total_seats for train in trains),
+            tickets_sold=sum(sale.tickets_sold for sale in sales),
+            total_revenue=sum(sale.total_revenue for sale in sales),
+            built_at=built_at,
+        )
+
+    def _train_sales_on(self, sale_date):
+        """某日各车次售出未退的票数和金额，返回 [(车次, 票数, 金额)]"""
+        cursor = self.get_db().cursor()
+        cursor.execute('''
+        SELECT train_id, tickets_sold - tickets_refunded, total_revenue - total_refund
+        FROM train_daily_sales
+        WHERE sale_date = ? AND tickets_sold > tickets_refunded
+        ''', (sale_date,))
+        return cursor.fetchall()
+
     def get_available_seats(self, train_id, date):
-        """获取指定车次的余票信息"""
+        """获取指定车次在某乘车日期的余票信息，未指定日期时查询当天"""
+        date = date or datetime.now().strftime('%Y-%m-%d')
         try:
             db = self.get_db()
             cursor = db.cursor()
             cursor.execute('''
-            SELECT * FROM available_tickets
-            WHERE train_id = ?
-            ''', (train_id,))
+            SELECT t.train_id, t.departure, t.destination, t.departure_time,
+                   t.arrival_time, t.total_seats, t.price, ? as travel_date,
+                   t.total_seats - COALESCE(s.sold_count, 0) as available_seats
+            FROM trains t
+            LEFT JOIN seat_inventory s
+                ON s.train_id = t.train_id AND s.travel_date = ?
+            WHERE t.train_id = ?
+            ''', (date, date, train_id))
             return cursor.fetchone()
         except sqlite3.Error as e:
             print(f"查询失败: {e}")
             return None
 
-    def get_passenger_orders(self, passenger_id):
-        """获取乘客的订票记录"""
+    def check_seat_inventory(self, repair=False):
+        """核对座位位图与 tickets 表，repair 为 True 时修复不一致项"""
+        try:
+            if repair:
+                return self._write(lambda cursor: self.seats.verify(cursor, repair=True))
+            return self.seats.verify(self.get_db().cursor())
+        except sqlite3.Error as e:
+            print(f"核对余票失败: {e}")
+            return None
+
+    def get_passenger_orders(self, passenger_id, limit=None, after=None):
+        """获取乘客的订票记录，按订票时间从新到旧分页，返回 Page"""
+        limit = self._page_size(limit)
+        after = decode_token(after, 2)
+        keyset = 'AND (t.booking_time, t.ticket_id) < (?, ?)' if after else ''
         try:
             db = self.get_db()
             cursor = db.cursor()
-            cursor.execute('''
+            cursor.execute(f'''
             SELECT 
                 t.ticket_id,
                 t.train_id,
@@ -683,99 +1091,185 @@ class TicketSystem:
                 t.seat_number,
                 t.booking_time,
                 t.status,
-                tr.price
+                tr.price,
+                t.travel_date
             FROM tickets t
             JOIN trains tr ON t.train_id = tr.train_id
             WHERE t.passenger_id = ?
-            ORDER BY t.booking_time DESC
-            ''', (passenger_id,))
-            return cursor.fetchall()
+            {keyset}
+            ORDER BY t.booking_time DESC, t.ticket_id DESC
+            LIMIT ?
+            ''', (passenger_id, *(after or ()), limit + 1))
+            return make_page(cursor.fetchall(), limit, lambda row: (row[7], row[0]))
         except sqlite3.Error as e:
             print(f"查询失败: {e}")
-            return []
+            return Page([], None)
 
-    def get_statistics(self, period='daily', start_date=None, end_date=None):
-        """获取统计数据
+    def get_statistics(self, period='daily', start_date=None, end_date=None,
+                       limit=None, after=None):
+        """获取统计数据，按日期从新到旧分页，返回 Page
         period: daily/monthly/yearly
         """
+        limit = self._page_size(limit)
+        after = decode_token(after, 1)
+        table, key = STATISTICS_TABLES.get(period, STATISTICS_TABLES['yearly'])
         try:
             db = self.get_db()
             cursor = db.cursor()
             
-            if period == 'daily':
-                table = 'daily_statistics'
-                date_format = '%Y-%m-%d'
-            elif period == 'monthly':
-                table = 'monthly_statistics'
-                date_format = '%Y-%m'
-            else:
-                table = 'yearly_statistics'
-                date_format = '%Y'
-            
-            query = f'SELECT * FROM {table}'
+            query = f'SELECT * FROM {table} WHERE 1=1'
             params = []
             
             if start_date and end_date:
-                query += ' WHERE date >= ? AND date <= ?'
+                query += f' AND {key} >= ? AND {key} <= ?'
                 params.extend([start_date, end_date])
             
-            query += ' ORDER BY date DESC'
+            if after:
+                query += f' AND {key} < ?'
+                params.append(after[0])
+            
+            query += f' ORDER BY {key} DESC LIMIT ?'
+            params.append(limit + 1)
             
             cursor.execute(query, params)
-            return cursor.fetchall()
+            return make_page(cursor.fetchall(), limit, lambda row: (row[0],))
             
         except sqlite3.Error as e:
             print(f"查询统计数据失败: {e}")
-            return []
+            return Page([], None)
 
-    def search_tickets_by_person(self, name=None, id_number=None):
-        """根据姓名或身份证号查询车票"""
+    def get_statistics_lag(self):
+        """统计数据汇总延迟(事件模式下待汇总的事件数和等待时间)"""
         try:
-            db = self.get_db()
-            cursor = db.cursor()
-            
-            query = '''
-            SELECT 
-                t.ticket_id,
-                t.train_id,
-                tr.departure,
-                tr.destination,
-                tr.departure_time,
-                tr.arrival_time,
-                t.seat_number,
-                t.booking_time,
-                t.status,
-                tr.price,
-                t.passenger_name,
-                t.passenger_id
-            FROM tickets t
-            JOIN trains tr ON t.train_id = tr.train_id
-            WHERE 1=1
-            '''
-            params = []
-            
+            lag = statistics_lag(self.get_db().cursor())
+        except sqlite3.Error as e:
+            print(f"查询统计延迟失败: {e}")
+            lag = {'pending_events': None, 'lag_seconds': None}
+        lag['mode'] = self.config.get('STATISTICS_MODE', STATISTICS_MODE_TRIGGER)
+        return lag
+
+    def _person_tickets_query(self, name=None, id_number=None, after=None):
+        """构造按姓名或身份证号查询车票的 SQL 和参数
+        
+        - 有身份证号时走 idx_tickets_passenger_time，按订票时间顺序读取，
+          姓名只在该乘客的订单中过滤
+        - 只有姓名时，3个字及以上用 trigram 全文索引做子串匹配，
+          更短的姓名(如"张三"、"张")用 idx_tickets_name 做前缀匹配
+        结果按订票时间从新到旧排列
+        """
+        query = '''
+        SELECT 
+            t.ticket_id,
+            t.train_id,
+            tr.departure,
+            tr.destination,
+            tr.departure_time,
+            tr.arrival_time,
+            t.seat_number,
+            t.booking_time,
+            t.status,
+            tr.price,
+            t.passenger_name,
+            t.passenger_id,
+            t.travel_date
+        FROM tickets t
+        JOIN trains tr ON t.train_id = tr.train_id
+        WHERE 1=1
+        '''
+        params = []
+        
+        if id_number:
+            query += " AND t.passenger_id = ?"
+            params.append(id_number)
             if name:
                 query += " AND t.passenger_name LIKE ?"
                 params.append(f"%{name}%")
-            if id_number:
-                query += " AND t.passenger_id = ?"
-                params.append(id_number)
-                
-            query += " ORDER BY t.booking_time DESC"
-            
-            cursor.execute(query, params)
-            return cursor.fetchall()
+        elif name and len(name) >= FTS_MIN_QUERY_LENGTH and self._has_name_index():
+            query += '''
+            AND t.ticket_id IN (
+                SELECT rowid FROM tickets_name_fts WHERE tickets_name_fts MATCH ?
+            )'''
+            params.append('"' + name.replace('"', '""') + '"')
+        elif name and len(name) < FTS_MIN_QUERY_LENGTH:
+            query += " AND t.passenger_name >= ? AND t.passenger_name < ?"
+            params.extend([name, name + '\U0010ffff'])
+        elif name:
+            query += " AND t.passenger_name LIKE ?"
+            params.append(f"%{name}%")
+        
+        # 从上一页最后一张车票之后继续
+        if after:
+            query += " AND (t.booking_time, t.ticket_id) < (?, ?)"
+            params.extend(after)
             
-        except sqlite3.Error as e:
-            print(f"查询失败: {e}")
-            return []
+        query += " ORDER BY t.booking_time DESC, t.ticket_id DESC"
+        return query, params
 
-    def change_ticket(self, ticket_id, new_train_id):
-        """改签功能"""
+    def search_tickets_by_person(self, name=None, id_number=None, limit=None, after=None):
+        """根据姓名或身份证号查询车票，按订票时间从新到旧分页，返回 Page"""
+        limit = self._page_size(limit)
         try:
+            query, params = self._person_tickets_query(name, id_number, decode_token(after, 2))
             db = self.get_db()
             cursor = db.cursor()
+            cursor.execute(query + " LIMIT ?", (*params, limit + 1))
+            return make_page(cursor.fetchall(), limit, lambda row: (row[7], row[0]))
             
+        except sqlite3.Error as e:
+            print(f"查询失败: {e}")
+            return Page([], None)
+
+    def _stream_query(self, query, params, chunk_size=EXPORT_CHUNK_SIZE):
+        """执行查询，返回 (列名, 逐块读取的行迭代器)，结果不整体载入内存"""
+        cursor = self.get_db().cursor()
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        
+        def rows():
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                yield from chunk
+        
+        return columns, rows()
+
+    def export_sales_report(self, start_date, end_date):
+        """流式导出销售报表"""
+        return self._stream_query(SALES_REPORT_SQL, (start_date, end_date))
+
+    def export_tickets(self, start_date, end_date):
+        """流式导出订票日期范围内的全部车票(按状态、订票日期顺序)"""
+        return self._stream_query('''
+        SELECT 
+            t.ticket_id,
+            t.train_id,
+            t.passenger_name,
+            t.passenger_id,
+            t.seat_number,
+            t.booking_time,
+            t.travel_date,
+            t.status,
+            t.is_group,
+            tr.price
+        FROM tickets t
+        JOIN trains tr ON t.train_id = tr.train_id
+        WHERE t.status IN ('已售', '已退')
+        AND t.booking_date BETWEEN ? AND ?
+        ''', (start_date, end_date))
+
+    def export_tickets_by_person(self, name=None, id_number=None):
+        """流式导出乘客的购票记录"""
+        return self._stream_query(*self._person_tickets_query(name, id_number))
+
+    def change_ticket(self, ticket_id, new_train_id, travel_date=None):
+        """改签功能，未指定乘车日期时沿用原票日期"""
+        booking_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        old_ticket = None
+        new_price = 0.0
+        
+        def change(cursor):
+            nonlocal old_ticket, new_price
             # 检查原票是否存在且为已售状态
             cursor.execute('''
             SELECT t.*, tr.price as old_price
@@ -788,62 +1282,67 @@ class TicketSystem:
             if not old_ticket:
                 return False, "原车票不存在或已退票"
             
-            # 检查新车次是否存在且有余票
+            # 检查新车次是否存在
             cursor.execute('''
-            SELECT total_seats, 
-                   (SELECT COUNT(*) FROM tickets 
-                    WHERE train_id = ? AND status = '已售') as sold_seats,
-                   price as new_price
-            FROM trains WHERE train_id = ?
-            ''', (new_train_id, new_train_id))
+            SELECT price as new_price FROM trains WHERE train_id = ?
+            ''', (new_train_id,))
             
             new_train = cursor.fetchone()
             if not new_train:
                 return False, "目标车次不存在"
+            new_price = new_train[0] or 0.0
+            
+            # 计算差价
+            price_diff = new_train[0] - old_ticket['old_price']
+            new_date = travel_date or old_ticket['travel_date']
+            
+            # 沿用的原票日期也可能已经过去，不能占用已过日期的座位
+            try:
+                valid_date = (datetime.strptime(new_date, '%Y-%m-%d').date()
+                              >= date.today())
+            except (TypeError, ValueError):
+                valid_date = False
+            if not valid_date:
+                return False, "请选择今天或之后的乘车日期"
             
-            if new_train[0] <= new_train[1]:
+            # 在目标车次分配座位
+            new_seat = self.seats.allocate(cursor, new_train_id, new_date)
+            if not new_seat:
                 return False, "目标车次无余票"
             
-            # 计算座位号
-            new_seat = new_train[1] + 1
+            # 将原票改为已退状态并释放原座位
+            cursor.execute('''
+            UPDATE tickets SET status = '已退'
+            WHERE ticket_id = ?
+            ''', (ticket_id,))
+            self.seats.release(cursor, old_ticket['train_id'],
+                               old_ticket['travel_date'], old_ticket['seat_number'])
             
-            # 计算差价
-            price_diff = new_train[2] - old_ticket['old_price']
+            # 创建新票
+            cursor.execute('''
+            INSERT INTO tickets 
+            (train_id, passenger_name, passenger_id, seat_number, 
+             booking_time, status, is_group, travel_date)
+            VALUES (?, ?, ?, ?, ?, '已售', ?, ?)
+            ''', (new_train_id, old_ticket['passenger_name'], 
+                 old_ticket['passenger_id'], new_seat, booking_time,
+                 old_ticket['is_group'], new_date))
             
-            # 开始改签事务
-            cursor.execute('BEGIN TRANSACTION')
-            try:
-                # 将原票改为已退状态
-                cursor.execute('''
-                UPDATE tickets SET status = '已退'
-                WHERE ticket_id = ?
-                ''', (ticket_id,))
-                
-                # 创建新票
-                cursor.execute('''
-                INSERT INTO tickets 
-                (train_id, passenger_name, passenger_id, seat_number, 
-                 booking_time, status, is_group)
-                VALUES (?, ?, ?, ?, ?, '已售', ?)
-                ''', (new_train_id, old_ticket['passenger_name'], 
-                     old_ticket['passenger_id'], new_seat,
-                     datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                     old_ticket['is_group']))
-                
-                cursor.execute('COMMIT')
-                
-                message = "改签成功"
-                if price_diff > 0:
-                    message += f"，需补差价：¥{price_diff:.2f}"
-                elif price_diff < 0:
-                    message += f"，可退差价：¥{-price_diff:.2f}"
-                    
-                return True, message
-                
-            except sqlite3.Error:
-                cursor.execute('ROLLBACK')
-                raise
-                
+            message = "改签成功"
+            if price_diff > 0:
+                message += f"，需补差价：¥{price_diff:.2f}"
+            elif price_diff < 0:
+                message += f"，可退差价：¥{-price_diff:.2f}"
+            return True, message
+        
+        try:
+            with self.dashboard.change() as sold:
+                result = self._write(change)
+                if result[0]:
+                    sold.add(old_ticket['booking_date'], old_ticket['train_id'],
+                             -1, -(old_ticket['old_price'] or 0.0))
+                    sold.add(booking_time[:10], new_train_id, 1, new_price)
+            return result
         except sqlite3.Error as e:
             print(f"改签失败: {e}")
             return False, "改签失败，请稍后重试"
@@ -867,7 +1366,8 @@ class TicketSystem:
                 tr.destination,
                 tr.departure_time,
                 tr.arrival_time,
-                tr.price
+                tr.price,
+                t.travel_date
             FROM tickets t
             JOIN trains tr ON t.train_id = tr.train_id
             WHERE t.ticket_id = ?
@@ -888,7 +1388,8 @@ class TicketSystem:
                     'destination': result[9],
                     'departure_time': result[10],
                     'arrival_time': result[11],
-                    'price': result[12]
+                    'price': result[12],
+                    'travel_date': result[13]
                 }
             return None
             
@@ -0,0 +1,153 @@
+import os
+import threading
+from bisect import bisect_left
+import time
+from collections import namedtuple
+
+TRAIN_COLUMNS = ('train_id', 'departure', 'destination', 'departure_time',
+                 'arrival_time', 'total_seats', 'price')
+
+# 车次信息，列顺序与 trains 表一致，支持 train[0] 和 train.train_id 两种访问方式
+Train = namedtuple('Train', TRAIN_COLUMNS)
+# 附带某日余票的车次信息
+AvailableTrain = namedtuple('AvailableTrain', TRAIN_COLUMNS + ('available_seats',))
+
+# 两次检查数据库版本号之间的最长间隔（秒），可由 config.Config 覆盖
+DEFAULT_CHECK_INTERVAL = 2.0
+
+CATALOG_NAME = 'trains'
+
+
+class _Bucket:
+    """按发车分钟排序的一组车次，minutes 与 trains 一一对应"""
+    __slots__ = ('minutes', 'trains')
+
+    def __init__(self):
+        self.minutes = []
+        self.trains = []
+
+    def append(self, minute, train):
+        self.minutes.append(minute)
+        self.trains.append(train)
+
+    def window(self, from_minute=None, to_minute=None):
+        """返回发车分钟在 [from_minute, to_minute) 内的车次"""
+        lo = 0 if from_minute is None else bisect_left(self.minutes, from_minute)
+        hi = len(self.minutes) if to_minute is None else bisect_left(self.minutes, to_minute)
+        return self.trains[lo:hi]
+
+
+class _Snapshot:
+    """某一版本的车次目录及其索引
+
+    rows 已按发车分钟排序，各索引内的车次保持同样的顺序，
+    与 trains 表的 (departure, destination, departure_minute) 索引一致。
+    """
+    __slots__ = ('version', 'all', 'by_departure', 'by_destination', 'by_route')
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.all = _Bucket()
+        self.by_departure = {}
+        self.by_destination = {}
+        self.by_route = {}
+        for minute, train in rows:
+            self.all.append(minute, train)
+            self.by_departure.setdefault(train.departure, _Bucket()).append(minute, train)
+            self.by_destination.setdefault(train.destination, _Bucket()).append(minute, train)
+            self.by_route.setdefault((train.departure, train.destination),
+                                     _Bucket()).append(minute, train)
+
+
+class TrainCatalog:
+    """进程内车次目录缓存
+
+    trains 表只在添加车次和修改票价时变化，查询直接读内存索引。
+    每次修改都会在 cache_versions 表中递增版本号：本进程修改后立即失效，
+    其他进程最多在 check_interval 秒后发现版本号变化并重新加载。
+    """
+
+    def __init__(self, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bump_version(cursor):
+        """在修改 trains 的事务中递增版本号，返回新版本号"""
+        cursor.execute('''
+        INSERT INTO cache_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+        ''', (CATALOG_NAME,))
+        cursor.execute('SELECT version FROM cache_versions WHERE name = ?', (CATALOG_NAME,))
+        return cursor.fetchone()[0]
+
+    def invalidate(self):
+        """丢弃缓存，下次查询时重新加载"""
+        with self._lock:
+            self._snapshot = None
+
+    def _current(self, get_conn):
+        """返回有效的目录快照，仅在需要校验或加载时才取数据库连接"""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and now - self._checked_at < self.check_interval:
+                return snapshot
+
+            conn = get_conn()
+            row = conn.execute('SELECT version FROM cache_versions WHERE name = ?',
+                               (CATALOG_NAME,)).fetchone()
+            version = row[0] if row else 0
+            if snapshot is None or snapshot.version != version:
+                rows = conn.execute(f'''
+                SELECT {', '.join(TRAIN_COLUMNS)}, departure_minute FROM trains
+                ORDER BY departure_minute, train_id
+                ''').fetchall()
+                snapshot = _Snapshot(version, [(row[-1], Train(*row[:-1])) for row in rows])
+                self._snapshot = snapshot
+            self._checked_at = now
+            return snapshot
+
+    def snapshot(self, get_conn):
+        """返回当前有效的目录快照"""
+        return self._current(get_conn)
+
+    def search(self, get_conn, departure=None, destination=None,
+               from_minute=None, to_minute=None):
+        """按出发站、目的站和发车时段查询车次
+
+        时段为当天分钟数的半开区间 [from_minute, to_minute)，省略表示不限。
+        返回按发车时间排序的 Train 列表。
+        """
+        snapshot = self._current(get_conn)
+        if departure and destination:
+            bucket = snapshot.by_route.get((departure, destination))
+        elif departure:
+            bucket = snapshot.by_departure.get(departure)
+        elif destination:
+            bucket = snapshot.by_destination.get(destination)
+        else:
+            bucket = snapshot.all
+        if bucket is None:
+            return []
+        return bucket.window(from_minute, to_minute)
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_train_catalog(database, check_interval=DEFAULT_CHECK_INTERVAL):
+    """获取数据库文件对应的车次目录缓存"""
+    key = os.path.abspath(database)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = TrainCatalog(check_interval)
+        return catalog
@@ -0,0 +1,58 @@
+import random
+import sqlite3
+import time
+
+from app import metrics
+from app.models.seat_inventory import SeatConflictError
+
+# 写事务在 busy_timeout 之外的重试参数，可由 config.Config 覆盖
+DEFAULT_WRITE_RETRIES = 5
+DEFAULT_RETRY_BASE_DELAY = 0.01   # 秒
+DEFAULT_RETRY_MAX_DELAY = 0.5     # 秒
+
+
+class WriteTimeout(sqlite3.OperationalError):
+    """写请求在等待时间内没有被写线程处理"""
+
+
+def is_busy_error(error):
+    """是否为 SQLITE_BUSY / SQLITE_LOCKED 一类可重试的锁冲突"""
+    if isinstance(error, (SeatConflictError, WriteTimeout)):
+        return True
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def run_in_transaction(conn, func, retries=DEFAULT_WRITE_RETRIES,
+                       base_delay=DEFAULT_RETRY_BASE_DELAY,
+                       max_delay=DEFAULT_RETRY_MAX_DELAY):
+    """在 BEGIN IMMEDIATE 写事务中执行 func(cursor) 并提交
+
+    BEGIN IMMEDIATE 在事务开始时就取得写锁，读取余票和写入订单之间
+    不会插入其他写者。遇到锁冲突时回滚，按指数退避加随机抖动重试，
+    超过重试次数后抛出最后一次的异常；其他异常回滚后直接抛出。
+    """
+    attempt = 0
+    while True:
+        cursor = conn.cursor()
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            cursor.execute('BEGIN IMMEDIATE')
+            result = func(cursor)
+            conn.commit()
+            return result
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not is_busy_error(e):
+                raise
+            if attempt >= retries:
+                metrics.record_lock_failure()
+                raise
+            metrics.record_lock_retry()
+            delay = min(max_delay, base_delay * (2 ** attempt))
+            time.sleep(random.uniform(0, delay))
+            attempt += 1
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# 用户信息缓存默认参数，可由 config.Config 覆盖
+DEFAULT_TTL = 60.0        # 秒
+DEFAULT_MAX_SIZE = 1024   # 最多缓存的用户数
+
+
+class UserProfileCache:
+    """进程内用户信息缓存，按 (用户名, 是否管理员) 缓存 get_user_info 的结果
+
+    条目超过 ttl 秒后失效，超过 max_size 时淘汰最久未使用的条目。
+    本进程内的修改和登录会立即失效对应条目，其他进程的修改最多延迟 ttl 秒可见。
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # 每次失效加一，加载期间发生过失效的结果不写入缓存
+        self._generation = 0
+
+    def get(self, username, is_admin, load):
+        """返回缓存的用户信息，未命中或已过期时调用 load() 加载
+
+        load 返回 None(用户不存在或查询失败)时不缓存。
+        """
+        key = (username, bool(is_admin))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+            generation = self._generation
+
+        user = load()
+        if user is None:
+            return None
+        user = tuple(user)
+        with self._lock:
+            if generation != self._generation:
+                return user
+            self._entries[key] = (now + self.ttl, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, username, is_admin):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop((username, bool(is_admin)), None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_user_cache(database, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+    """获取数据库文件对应的进程级用户信息缓存"""
+    key = os.path.abspath(database)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = UserProfileCache(ttl, max_size)
+        return cache
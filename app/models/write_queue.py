@@ -0,0 +1,208 @@
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from app import metrics
+from app.models.db_pool import get_app_pool, get_pool
+from app.models.transactions import (
+    DEFAULT_WRITE_RETRIES, WriteTimeout, is_busy_error, run_in_transaction
+)
+
+# 单写线程默认参数，可由 config.Config 覆盖
+DEFAULT_BATCH_SIZE = 64         # 一个事务最多合并的写请求数
+DEFAULT_SUBMIT_TIMEOUT = 30.0   # 调用方等待写入结果的秒数
+
+
+class _WriteRequest:
+    __slots__ = ('func', 'future', 'method')
+
+    def __init__(self, func, method):
+        self.func = func
+        self.future = Future()
+        self.method = method
+
+
+class WriteQueue:
+    """进程内的单写线程
+
+    写线程独占一个连接，从队列中取出写请求，一次最多合并 batch_size 个请求
+    放进同一个 BEGIN IMMEDIATE 事务(组提交)。每个请求在自己的 SAVEPOINT 中执行，
+    出错时只回滚该请求并把异常交给它的 Future，其余请求照常提交。
+    锁冲突(其他进程持有写锁或座位位图被改动)时整批回滚重试。
+    """
+
+    def __init__(self, pool, batch_size=DEFAULT_BATCH_SIZE, retries=DEFAULT_WRITE_RETRIES,
+                 timeout=DEFAULT_SUBMIT_TIMEOUT):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.retries = retries
+        self.timeout = timeout
+        self.pid = None     # 启动写线程的进程
+        self.total_requests = 0
+        self.total_batches = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, func):
+        """提交写请求 func(cursor)，返回 Future"""
+        request = _WriteRequest(func, metrics.current_method())
+        self._queue.put(request)
+        return request.future
+
+    def run(self, func):
+        """提交写请求并等待结果，func 抛出的异常原样抛给调用方"""
+        future = self.submit(func)
+        if not future.done() and not self._thread.is_alive():
+            raise WriteTimeout("写入线程未运行")
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise WriteTimeout(f"等待写入超时({self.timeout}秒)")
+        # 写线程已开始执行，请求可能已经提交，等待真实结果而不是报告失败
+        return future.result()
+
+    def _next_batch(self):
+        """阻塞等待第一个请求，再取出已排队的请求，最多 batch_size 个"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    @staticmethod
+    def _apply(cursor, batch):
+        """在当前事务中逐个执行请求，返回 [(请求, 结果, 异常)]"""
+        outcomes = []
+        for request in batch:
+            metrics.set_current_method(request.method)
+            cursor.execute('SAVEPOINT write_request')
+            try:
+                result = request.func(cursor)
+            except Exception as e:
+                cursor.execute('ROLLBACK TO write_request')
+                cursor.execute('RELEASE write_request')
+                if is_busy_error(e):
+                    raise
+                outcomes.append((request, None, e))
+            else:
+                cursor.execute('RELEASE write_request')
+                outcomes.append((request, result, None))
+            finally:
+                metrics.set_current_method(None)
+        return outcomes
+
+    def _process(self, conn, batch):
+        # 已超时放弃的请求不再执行
+        batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            outcomes = run_in_transaction(conn, lambda cursor: self._apply(cursor, batch),
+                                          retries=self.retries)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        self.total_requests += len(batch)
+        self.total_batches += 1
+        for request, result, error in outcomes:
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(result)
+
+    def _run(self):
+        conn = self.pool.acquire()
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                self._process(conn, batch)
+        finally:
+            self.pool.release(conn)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+            self._thread.start()
+
+    def ensure_started(self):
+        """确保当前进程中的写线程在运行
+
+        fork 出的子进程没有父进程的线程，也不能复用父进程的连接，
+        改用本进程的连接池和新的队列(继承来的请求由父进程处理)并注册退出时停止。
+        """
+        if self.pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self.pid != os.getpid():
+                self.pool = get_pool(self.pool.database, self.pool.size, self.pool.timeout,
+                                     self.pool.pragmas)
+                self._queue = queue.Queue()
+                self._thread = None
+                self.total_requests = 0
+                self.total_batches = 0
+                self.pid = os.getpid()
+                atexit.register(self.stop)
+            self.start()
+
+    def stop(self):
+        """处理完已排队的请求后停止写线程"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(self.timeout)
+
+    def status(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'queued': self._queue.qsize(),
+            'total_requests': self.total_requests,
+            'total_batches': self.total_batches,
+        }
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_queue(database):
+    """数据库对应的写线程，未开启时为 None(各连接直接写入)
+
+    fork 出的子进程首次使用时启动自己的写线程。
+    """
+    write_queue = _queues.get(os.path.abspath(database))
+    if write_queue is not None:
+        write_queue.ensure_started()
+    return write_queue
+
+
+def init_write_queue(app):
+    """按 WRITE_QUEUE_ENABLED 启动本进程的单写线程"""
+    if not app.config.get('WRITE_QUEUE_ENABLED', True):
+        return
+    key = os.path.abspath(app.config['DATABASE'])
+    write_queue = WriteQueue(
+        get_app_pool(app.config),
+        batch_size=app.config.get('WRITE_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+        retries=app.config.get('DB_WRITE_RETRIES', DEFAULT_WRITE_RETRIES),
+    )
+    with _queues_lock:
+        previous = _queues.get(key)
+        _queues[key] = write_queue
+    if previous is not None and previous.pid == os.getpid():
+        previous.stop()
+    write_queue.ensure_started()
@@ -1,9 +1,16 @@
+import csv
+import io
+import json
+import sqlite3
 from flask import (
     Blueprint, render_template, request, jsonify, flash, 
-    redirect, url_for, session
+    redirect, url_for, session, Response, stream_with_context, current_app
 )
+from app import metrics
 from app.routes.auth import login_required
 from app.models import get_db
+from app.models.slow_queries import get_slow_query_log
+from app.models.statistics import get_aggregator
 from datetime import datetime, timedelta
 from functools import wraps
 
@@ -14,7 +21,7 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if not session.get('is_admin', False):
             flash('需要管理员权限', 'error')
-            return redirect(url_for('index'))
+            return redirect(url_for('index.index'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -25,23 +32,34 @@ def dashboard():
     """管理员仪表板"""
     db = get_db()
     
-    # 获取今天的日期
-    today = datetime.now().date()
-    
-    # 获取销售统计
-    sales = db.get_daily_sales(today.strftime('%Y-%m-%d'))
+    # 今日销售概览，由进程内快照维护
+    overview = db.get_dashboard()
     
     # 获取车次统计
     trains = db.search_trains()
     
-    # 计算总收入
-    total_revenue = sum(sale[4] for sale in sales) if sales else 0
-    
     return render_template('admin/dashboard.html',
-                         sales=sales,
+                         sales=overview.sales,
                          trains=trains,
-                         today=today.strftime('%Y-%m-%d'),
-                         total_revenue=total_revenue)
+                         today=overview.date,
+                         tickets_sold=overview.tickets_sold,
+                         total_revenue=overview.total_revenue)
+
+@bp.route('/dashboard.json')
+@login_required
+@admin_required
+def dashboard_json():
+    """仪表板数据，供页面自动刷新"""
+    overview = get_db().get_dashboard()
+    return jsonify({
+        'date': overview.date,
+        'train_count': overview.train_count,
+        'total_seats': overview.total_seats,
+        'tickets_sold': overview.tickets_sold,
+        'total_revenue': overview.total_revenue,
+        'built_at': overview.built_at,
+        'sales': [sale._asdict() for sale in overview.sales],
+    })
 
 @bp.route('/reports')
 @login_required
@@ -57,16 +75,102 @@ def reports():
         start_date = (today - timedelta(days=30)).strftime('%Y-%m-%d')
     
     db = get_db()
-    report_data = db.generate_sales_report(start_date, end_date)
+    report_data, next_token = db.generate_sales_report(
+        start_date, end_date,
+        limit=request.args.get('limit', type=int),
+        after=request.args.get('after'))
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return jsonify(report_data)
+        return jsonify({'rows': [list(row) for row in report_data], 'next': next_token})
     
     return render_template('admin/reports.html',
                          report_data=report_data,
+                         next_token=next_token,
                          start_date=start_date,
                          end_date=end_date)
 
+def export_response(export, filename, fmt):
+    """把 (列名, 行迭代器) 包装成边查询边发送的 CSV 或 NDJSON 响应"""
+    try:
+        columns, rows = export()
+    except sqlite3.Error as e:
+        print(f"导出失败: {e}")
+        return jsonify({'error': '导出失败'}), 500
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # 带 BOM，便于 Excel 正确识别中文
+        buffer.write('\ufeff')
+        writer.writerow(columns)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if count % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    def generate_ndjson():
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+    
+    if fmt == 'ndjson':
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+    else:
+        body, mimetype, fmt = generate_csv(), 'text/csv', 'csv'
+    
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{fmt}'
+    return response
+
+def export_date_range():
+    """导出的日期范围，默认最近30天"""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    if not start_date or not end_date:
+        today = datetime.now().date()
+        end_date = today.strftime('%Y-%m-%d')
+        start_date = (today - timedelta(days=30)).strftime('%Y-%m-%d')
+    return start_date, end_date
+
+@bp.route('/export/sales_report')
+@login_required
+@admin_required
+def export_sales_report():
+    """导出销售报表(format=csv/ndjson)"""
+    start_date, end_date = export_date_range()
+    db = get_db()
+    return export_response(lambda: db.export_sales_report(start_date, end_date),
+                           f'sales_report_{start_date}_{end_date}',
+                           request.args.get('format'))
+
+@bp.route('/export/tickets')
+@login_required
+@admin_required
+def export_tickets():
+    """导出日期范围内的全部车票(format=csv/ndjson)"""
+    start_date, end_date = export_date_range()
+    db = get_db()
+    return export_response(lambda: db.export_tickets(start_date, end_date),
+                           f'tickets_{start_date}_{end_date}',
+                           request.args.get('format'))
+
+@bp.route('/export/passenger')
+@login_required
+@admin_required
+def export_passenger():
+    """导出乘客购票记录(format=csv/ndjson)"""
+    name = request.args.get('name')
+    id_number = request.args.get('id_number')
+    if not name and not id_number:
+        return jsonify({'error': '请输入姓名或身份证号'}), 400
+    
+    db = get_db()
+    return export_response(lambda: db.export_tickets_by_person(name, id_number),
+                           'passenger_tickets',
+                           request.args.get('format'))
+
 @bp.route('/trains/add', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -105,6 +209,23 @@ def add_train():
     
     return render_template('admin/add_train.html')
 
+@bp.route('/inventory_check', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def inventory_check():
+    """核对余票计数，POST 时按车票记录修复"""
+    repair = request.method == 'POST'
+    problems = get_db().check_seat_inventory(repair=repair)
+    
+    if problems is None:
+        return jsonify({'error': '核对失败'}), 500
+    
+    return jsonify({
+        'repaired': repair,
+        'problem_count': len(problems),
+        'problems': problems
+    })
+
 @bp.route('/statistics')
 @login_required
 @admin_required
@@ -115,10 +236,48 @@ def statistics():
     end_date = request.args.get('end_date')
     
     db = get_db()
-    stats = db.get_statistics(period, start_date, end_date)
+    stats, next_token = db.get_statistics(
+        period, start_date, end_date,
+        limit=request.args.get('limit', type=int),
+        after=request.args.get('after'))
     
     return render_template('admin/statistics.html',
                          stats=stats,
+                         next_token=next_token,
+                         lag=db.get_statistics_lag(),
                          period=period,
                          start_date=start_date,
-                         end_date=end_date) 
\ No newline at end of file
+                         end_date=end_date) 
+
+@bp.route('/statistics/lag')
+@login_required
+@admin_required
+def statistics_lag():
+    """统计汇总延迟，供监控轮询"""
+    lag = get_db().get_statistics_lag()
+    aggregator = get_aggregator()
+    lag['aggregator'] = aggregator.status() if aggregator else None
+    return jsonify(lag)
+
+@bp.route('/metrics')
+@login_required
+@admin_required
+def metrics_view():
+    """Prometheus 文本格式的监控指标"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/slow_queries', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def slow_queries():
+    """慢查询及其执行计划"""
+    log = get_slow_query_log(current_app.config['DATABASE'])
+    if request.method == 'POST':
+        log.clear()
+        flash('慢查询记录已清空', 'success')
+        return redirect(url_for('admin.slow_queries'))
+    return render_template('admin/slow_queries.html',
+                         enabled=log.enabled,
+                         threshold_ms=log.threshold * 1000,
+                         statements=log.statements(),
+                         entries=log.entries())
@@ -18,7 +18,7 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if not session.get('is_admin', False):
             flash('需要管理员权限', 'error')
-            return redirect(url_for('index'))
+            return redirect(url_for('index.index'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -46,7 +46,7 @@ def login():
             session['is_admin'] = is_admin
             flash('登录成功！', 'success')
             next_page = request.args.get('next')
-            return redirect(next_page if next_page else url_for('index'))
+            return redirect(next_page if next_page else url_for('index.index'))
         else:
             flash('用户名或密码错误', 'error')
         
@@ -118,4 +118,4 @@ def profile():
 def logout():
     session.clear()
     flash('已退出登录', 'success')
-    return redirect(url_for('index')) 
\ No newline at end of file
+    return redirect(url_for('index.index')) 
\ No newline at end of file
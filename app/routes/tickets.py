@@ -1,10 +1,39 @@
+import re
 from datetime import datetime, date
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session
+from flask import (
+    Blueprint, render_template, request, flash, redirect, url_for, session,
+    current_app
+)
 from app.routes.auth import login_required
 from app.models import get_db
 
 bp = Blueprint('tickets', __name__, url_prefix='/tickets')
 
+# 出发时段对应的发车分钟区间 [起, 止)
+TIME_RANGES = {
+    'morning': (6 * 60, 12 * 60),
+    'afternoon': (12 * 60, 18 * 60),
+    'evening': (18 * 60, 24 * 60),
+}
+
+def parse_travel_date(date_str):
+    """解析乘车日期，格式错误或早于今天时返回 None"""
+    try:
+        travel_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+    if travel_date < date.today():
+        return None
+    return travel_date
+
+def parse_minute(time_str):
+    """将 HH:MM 解析为当天第几分钟，格式错误时返回 None"""
+    try:
+        time = datetime.strptime(time_str, '%H:%M')
+    except (TypeError, ValueError):
+        return None
+    return time.hour * 60 + time.minute
+
 @bp.route('/search')
 def search():
     departure = request.args.get('departure')
@@ -14,27 +43,74 @@ def search():
     
     # 获取今天的日期
     today = date.today().strftime('%Y-%m-%d')
+    travel_date = date_str or today
     
     trains = []
     if departure or destination:
-        trains = get_db().search_trains(departure, destination)
-        
-        # 根据时间段筛选
-        if time_range:
-            filtered_trains = []
-            for train in trains:
-                time = datetime.strptime(train[3], '%H:%M').time()
-                if time_range == 'morning' and 6 <= time.hour < 12:
-                    filtered_trains.append(train)
-                elif time_range == 'afternoon' and 12 <= time.hour < 18:
-                    filtered_trains.append(train)
-                elif time_range == 'evening' and 18 <= time.hour < 24:
-                    filtered_trains.append(train)
-            trains = filtered_trains
+        if not parse_travel_date(travel_date):
+            flash('请选择今天或之后的乘车日期', 'error')
+            return render_template('tickets/search.html', trains=trains,
+                                   today=today, travel_date=today)
+        
+        # 出发时段：预设时段或 from_time/to_time 指定的任意时段(含两端)
+        from_minute, to_minute = TIME_RANGES.get(time_range, (None, None))
+        if request.args.get('from_time'):
+            from_minute = parse_minute(request.args.get('from_time'))
+        if request.args.get('to_time'):
+            to_minute = parse_minute(request.args.get('to_time'))
+            if to_minute is not None:
+                to_minute += 1
+        
+        # 当天只显示尚未发车的车次
+        if travel_date == today:
+            now = datetime.now()
+            next_minute = now.hour * 60 + now.minute + 1
+            from_minute = max(from_minute or 0, next_minute)
+        
+        trains = get_db().search_trains(departure, destination,
+                                        travel_date=travel_date,
+                                        from_minute=from_minute,
+                                        to_minute=to_minute)
     
     return render_template('tickets/search.html', 
                          trains=trains, 
-                         today=today)
+                         today=today,
+                         travel_date=travel_date)
+
+@bp.route('/transfer')
+def transfer():
+    """中转换乘查询"""
+    departure = request.args.get('departure')
+    destination = request.args.get('destination')
+    sort = request.args.get('sort', 'duration')
+    
+    today = date.today().strftime('%Y-%m-%d')
+    travel_date = request.args.get('date') or today
+    
+    itineraries = []
+    if departure and destination:
+        if not parse_travel_date(travel_date):
+            flash('请选择今天或之后的乘车日期', 'error')
+            return redirect(url_for('tickets.transfer'))
+        
+        # 当天只考虑尚未发车的首段车次
+        from_minute = None
+        if travel_date == today:
+            now = datetime.now()
+            from_minute = now.hour * 60 + now.minute + 1
+        
+        itineraries = get_db().plan_routes(departure, destination,
+                                           travel_date=travel_date,
+                                           sort=sort,
+                                           from_minute=from_minute)
+    
+    return render_template('tickets/transfer.html',
+                         itineraries=itineraries,
+                         departure=departure,
+                         destination=destination,
+                         sort=sort,
+                         today=today,
+                         travel_date=travel_date)
 
 @bp.route('/book', methods=['GET', 'POST'])
 @login_required
@@ -44,12 +120,17 @@ def book():
         train_id = request.form.get('train_id')
         passenger_name = request.form.get('passenger_name')
         passenger_id = request.form.get('passenger_id')
+        travel_date = request.form.get('travel_date')
         is_group = request.form.get('is_group') == 'on'
         
-        if not all([train_id, passenger_name, passenger_id]):
+        if not all([train_id, passenger_name, passenger_id, travel_date]):
             flash('请填写所有必要信息', 'error')
             return redirect(url_for('tickets.book'))
         
+        if not parse_travel_date(travel_date):
+            flash('请选择今天或之后的乘车日期', 'error')
+            return redirect(url_for('tickets.book', train_id=train_id))
+        
         # 获取用户信息
         db = get_db()
         user = db.get_user_info(session['username'], session.get('is_admin', False))
@@ -64,7 +145,7 @@ def book():
             passenger_id = user[4]    # id_number 字段
         
         success, message = db.book_ticket(
-            train_id, passenger_name, passenger_id, is_group
+            train_id, passenger_name, passenger_id, is_group, travel_date
         )
         
         if success:
@@ -74,8 +155,9 @@ def book():
             flash('订票失败：' + message, 'error')
             return redirect(url_for('tickets.book'))
             
-    # 获取预选的车次ID
+    # 获取预选的车次ID和乘车日期
     train_id = request.args.get('train_id')
+    travel_date = request.args.get('date') or date.today().strftime('%Y-%m-%d')
     
     # 获取用户信息
     db = get_db()
@@ -87,8 +169,69 @@ def book():
     
     return render_template('tickets/book.html', 
                          train_id=train_id,
+                         travel_date=travel_date,
+                         today=date.today().strftime('%Y-%m-%d'),
                          user=user_data)
 
+def parse_passengers(text):
+    """解析团体乘客名单，每行一位乘客: 姓名,身份证号
+    
+    返回 (乘客列表, 出错行号)，全部解析成功时出错行号为 None
+    """
+    passengers = []
+    for line_no, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        parts = [part for part in re.split(r'[,，\s]+', line) if part]
+        if len(parts) != 2:
+            return passengers, line_no
+        passengers.append((parts[0], parts[1]))
+    return passengers, None
+
+@bp.route('/book_group', methods=['GET', 'POST'])
+@login_required
+def book_group():
+    """团体购票"""
+    max_size = current_app.config.get('GROUP_BOOKING_MAX_SIZE', 500)
+    
+    if request.method == 'POST':
+        train_id = request.form.get('train_id')
+        travel_date = request.form.get('travel_date')
+        passenger_text = request.form.get('passengers', '')
+        
+        if not all([train_id, travel_date, passenger_text.strip()]):
+            flash('请填写所有必要信息', 'error')
+            return redirect(url_for('tickets.book_group', train_id=train_id))
+        
+        if not parse_travel_date(travel_date):
+            flash('请选择今天或之后的乘车日期', 'error')
+            return redirect(url_for('tickets.book_group', train_id=train_id))
+        
+        passengers, bad_line = parse_passengers(passenger_text)
+        if bad_line is not None:
+            flash(f'乘客名单第 {bad_line} 行格式错误，应为: 姓名,身份证号', 'error')
+            return redirect(url_for('tickets.book_group', train_id=train_id))
+        
+        if len(passengers) > max_size:
+            flash(f'团体订票单次最多 {max_size} 人', 'error')
+            return redirect(url_for('tickets.book_group', train_id=train_id))
+        
+        success, message = get_db().book_group(train_id, passengers, travel_date)
+        
+        if success:
+            flash(message, 'success')
+            return redirect(url_for('tickets.search_person'))
+        else:
+            flash('订票失败：' + message, 'error')
+            return redirect(url_for('tickets.book_group', train_id=train_id))
+    
+    return render_template('tickets/book_group.html',
+                         train_id=request.args.get('train_id'),
+                         travel_date=request.args.get('date'),
+                         today=date.today().strftime('%Y-%m-%d'),
+                         max_size=max_size)
+
 @bp.route('/refund', methods=['GET', 'POST'])
 @login_required
 def refund():
@@ -98,6 +241,7 @@ def refund():
 def search_person():
     """个人车票查询"""
     tickets = []
+    next_token = None
     db = get_db()
     user_data = None
     
@@ -109,7 +253,10 @@ def search_person():
             flash('请输入姓名或身份证号', 'error')
             return redirect(url_for('tickets.search_person'))
         
-        tickets = db.search_tickets_by_person(name, id_number)
+        # 翻页也用 POST 提交，避免身份证号出现在 URL 中
+        user_data = {'real_name': name, 'id_number': id_number}
+        tickets, next_token = db.search_tickets_by_person(
+            name, id_number, after=request.form.get('after'))
     else:
         # 如果用户已登录，默认查询自己的车票
         if 'username' in session:
@@ -119,13 +266,15 @@ def search_person():
                     'real_name': user[2],
                     'id_number': user[4]
                 }
-                tickets = db.search_tickets_by_person(
+                tickets, next_token = db.search_tickets_by_person(
                     name=user[2],
                     id_number=user[4]
                 )
     
     return render_template('tickets/search_person.html', 
                          tickets=tickets,
+                         next_token=next_token,
+                         paged=bool(request.form.get('after')),
                          user=user_data) 
 
 @bp.route('/refund_ticket', methods=['POST'])
@@ -154,13 +303,18 @@ def change_ticket():
     if request.method == 'POST':
         ticket_id = request.form.get('ticket_id')
         new_train_id = request.form.get('new_train_id')
+        travel_date = request.form.get('travel_date')
         
         if not all([ticket_id, new_train_id]):
             flash('请选择要改签的车票和目标车次', 'error')
             return redirect(url_for('tickets.search_person'))
         
+        if travel_date and not parse_travel_date(travel_date):
+            flash('请选择今天或之后的乘车日期', 'error')
+            return redirect(url_for('tickets.change_ticket', ticket_id=ticket_id))
+        
         db = get_db()
-        success, message = db.change_ticket(ticket_id, new_train_id)
+        success, message = db.change_ticket(ticket_id, new_train_id, travel_date)
         
         if success:
             flash(message, 'success')
@@ -181,7 +335,8 @@ def change_ticket():
     # 获取可改签的车次列表
     available_trains = db.search_trains(
         departure=ticket['departure'],
-        destination=ticket['destination']
+        destination=ticket['destination'],
+        travel_date=ticket['travel_date']
     ) if ticket else []
     
     return render_template('tickets/change_ticket.html',
@@ -0,0 +1,4 @@
+from app.asgi import create_asgi_app
+
+# ASGI 服务入口，如: uvicorn asgi:app --workers 2
+app = create_asgi_app()
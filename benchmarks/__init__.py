@@ -0,0 +1 @@
+# 性能测试与压力测试脚本，使用 python -m benchmarks.<模块名> 运行
@@ -0,0 +1,90 @@
+"""生成基准测试用的数据库
+
+按指定车票数量生成车次和历史订单(见 app.models.bulk_load)，同一规模的数据库生成一次后重复使用。
+
+    python -m benchmarks.dataset --size 1m
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.bulk_load import bulk_load  # noqa: E402
+from app.models.ticket_system import TicketSystem  # noqa: E402
+
+SIZES = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'ticket_benchmarks')
+
+TRAIN_COUNT = 300
+SEED = 20240101
+
+
+def parse_size(value):
+    """解析规模参数，支持 10k/1m/10m 或直接给出车票数"""
+    if value in SIZES:
+        return SIZES[value]
+    return int(value)
+
+
+def database_path(size, data_dir=DEFAULT_DATA_DIR):
+    return os.path.join(data_dir, f'bench_{size}.db')
+
+
+def seed_database(database, count, verbose=True):
+    """建表并用批量导入工具写入 count 张订单，数据由固定种子生成"""
+    system = TicketSystem(database)
+    system.create_tables()
+    system.close_db()
+
+    def progress(phase, done, total):
+        if phase == 'tickets':
+            print(f'\r已写入 {done}/{total} 张订单', end='\n' if done >= total else '',
+                  flush=True)
+
+    result = bulk_load(database, trains=TRAIN_COUNT, users=min(count // 20, 100000),
+                       tickets=count, seed=SEED, progress=progress if verbose else None)
+    if verbose:
+        print(f'生成完成: {database} ({result["timings"]["total"]}s)')
+
+
+def ensure_database(size, data_dir=DEFAULT_DATA_DIR, verbose=True):
+    """返回指定规模的数据库路径，不存在时生成
+
+    生成完成后写入 .seeded 标记文件，未完成的数据库会被删除重建。
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    database = database_path(size, data_dir)
+    marker = database + '.seeded'
+    if os.path.exists(marker):
+        return database
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+    seed_database(database, parse_size(size), verbose=verbose)
+    with open(marker, 'w') as f:
+        f.write(datetime.now().isoformat())
+    return database
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成基准测试数据库')
+    parser.add_argument('--size', nargs='+', default=['10k'],
+                        help='车票数量: 10k/1m/10m 或具体数字')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='数据库存放目录')
+    args = parser.parse_args(argv)
+
+    for size in args.size:
+        print(ensure_database(size, args.data_dir))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
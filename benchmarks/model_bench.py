@@ -0,0 +1,266 @@
+"""TicketSystem 热点方法基准测试
+
+在 10k/1m/10m 规模的数据库上逐个测量各方法的调用延迟，输出分位数，
+可写出 JSON 结果，并与保存的基线比较，性能退化时以非零状态退出。
+
+    python -m benchmarks.model_bench --size 10k 1m --json result.json
+    python -m benchmarks.model_bench --size 1m --baseline benchmarks/baseline.json
+    python -m benchmarks.model_bench --size 1m --save-baseline benchmarks/baseline.json
+
+数据库生成一次后重复使用(见 benchmarks.dataset)，订票、改签、退票会写入少量新订单。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.ticket_system import TicketSystem  # noqa: E402
+from benchmarks.dataset import DEFAULT_DATA_DIR, ensure_database  # noqa: E402
+
+DEFAULT_ITERATIONS = 200
+DEFAULT_THRESHOLD = 0.25       # 分位数比基线慢 25% 视为退化
+MIN_REGRESSION_MS = 0.05       # 绝对差值小于此值时忽略(计时噪声)
+COMPARED_PERCENTILES = ('p50_ms', 'p95_ms')
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法分位数"""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    """将秒为单位的耗时样本汇总为毫秒分位数"""
+    values = sorted(sample * 1000 for sample in samples)
+    total = sum(values)
+    return {
+        'count': len(values),
+        'mean_ms': round(total / len(values), 4),
+        'min_ms': round(values[0], 4),
+        'p50_ms': round(percentile(values, 0.50), 4),
+        'p90_ms': round(percentile(values, 0.90), 4),
+        'p95_ms': round(percentile(values, 0.95), 4),
+        'p99_ms': round(percentile(values, 0.99), 4),
+        'max_ms': round(values[-1], 4),
+        'ops_per_sec': round(len(values) / (total / 1000), 1) if total else None,
+    }
+
+
+def measure(func, arguments, warmup=5):
+    """依次以 arguments 中的参数调用 func，返回每次调用的耗时(秒)"""
+    for args in arguments[:warmup]:
+        func(*args)
+    samples = []
+    for args in arguments[warmup:]:
+        started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+class Workload:
+    """从数据库抽样生成各方法的调用参数"""
+
+    def __init__(self, database, iterations, seed=7):
+        self.iterations = iterations
+        self.rng = random.Random(seed)
+        conn = sqlite3.connect(database)
+        self.trains = conn.execute('''
+        SELECT train_id, departure, destination FROM trains ORDER BY train_id
+        ''').fetchall()
+        max_id = conn.execute('SELECT MAX(ticket_id) FROM tickets').fetchone()[0] or 0
+        ids = [self.rng.randint(1, max_id) for _ in range(iterations * 2)]
+        self.passengers = conn.execute(f'''
+        SELECT passenger_name, passenger_id FROM tickets
+        WHERE ticket_id IN ({', '.join('?' * len(ids))})
+        ''', ids).fetchall()
+        self.booking_days = [row[0] for row in conn.execute('''
+        SELECT DISTINCT date FROM daily_statistics ORDER BY date
+        ''')]
+        conn.close()
+
+    def count(self):
+        return self.iterations + 5
+
+    def future_date(self):
+        return (date.today() + timedelta(days=self.rng.randint(1, 25))).strftime('%Y-%m-%d')
+
+    def date_range(self, days):
+        if not self.booking_days:
+            today = date.today()
+            return (today - timedelta(days=days)).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')
+        start = self.rng.choice(self.booking_days)
+        end = date.fromisoformat(start) + timedelta(days=days)
+        return start, end.strftime('%Y-%m-%d')
+
+    def search_trains(self):
+        return [(train[1], train[2], self.future_date())
+                for train in self.rng.choices(self.trains, k=self.count())]
+
+    def available_seats(self):
+        return [(train[0], self.future_date())
+                for train in self.rng.choices(self.trains, k=self.count())]
+
+    def person_by_name(self):
+        return [(name, None) for name, _ in self.rng.choices(self.passengers, k=self.count())]
+
+    def person_by_id(self):
+        return [(None, id_number)
+                for _, id_number in self.rng.choices(self.passengers, k=self.count())]
+
+    def sales_report(self):
+        return [self.date_range(30) for _ in range(self.count())]
+
+    def statistics(self):
+        return [('daily', *self.date_range(30)) for _ in range(self.count())]
+
+    def bookings(self):
+        return [(train[0], f'压测{n}', f'{990000000000000000 + n:018d}', False,
+                 self.future_date())
+                for n, train in enumerate(self.rng.choices(self.trains, k=self.count()))]
+
+
+def booked_tickets(system):
+    """本轮订票产生的车票及其线路"""
+    cursor = system.get_db().cursor()
+    cursor.execute('''
+    SELECT t.ticket_id, t.train_id, tr.departure, tr.destination
+    FROM tickets t JOIN trains tr ON tr.train_id = t.train_id
+    WHERE t.passenger_id >= '990000000000000000' AND t.status = '已售'
+    ORDER BY t.ticket_id DESC LIMIT 10000
+    ''')
+    return cursor.fetchall()
+
+
+def run_size(size, iterations, data_dir):
+    """在一个规模的数据库上运行全部用例，返回 {用例名: 汇总}"""
+    database = ensure_database(size, data_dir)
+    workload = Workload(database, iterations)
+    system = TicketSystem(database)
+    results = {}
+
+    read_cases = (
+        ('search_trains', lambda d, t, day: system.search_trains(d, t, travel_date=day),
+         workload.search_trains()),
+        ('get_available_seats', system.get_available_seats, workload.available_seats()),
+        ('search_tickets_by_person[name]', system.search_tickets_by_person,
+         workload.person_by_name()),
+        ('search_tickets_by_person[id]', system.search_tickets_by_person,
+         workload.person_by_id()),
+        ('generate_sales_report', system.generate_sales_report, workload.sales_report()),
+        ('get_statistics', system.get_statistics, workload.statistics()),
+    )
+    for name, func, arguments in read_cases:
+        results[name] = summarize(measure(func, arguments))
+
+    results['book_ticket'] = summarize(measure(system.book_ticket, workload.bookings()))
+
+    # 改签和退票使用刚订出的车票
+    tickets = booked_tickets(system)
+    workload.rng.shuffle(tickets)
+    by_route = {}
+    for train_id, departure, destination in workload.trains:
+        by_route.setdefault((departure, destination), []).append(train_id)
+    change_args = []
+    for ticket_id, train_id, departure, destination in tickets[:workload.count()]:
+        candidates = [t for t in by_route[(departure, destination)] if t != train_id]
+        change_args.append((ticket_id, workload.rng.choice(candidates) if candidates else train_id,
+                            workload.future_date()))
+    results['change_ticket'] = summarize(measure(system.change_ticket, change_args))
+
+    tickets = booked_tickets(system)
+    refund_args = [(ticket[0],) for ticket in tickets[:workload.count()]]
+    results['refund_ticket'] = summarize(measure(system.refund_ticket, refund_args))
+
+    system.close_db()
+    return results
+
+
+def compare(current, baseline, threshold):
+    """与基线比较，返回退化项列表 (规模, 用例, 分位数, 基线值, 当前值)"""
+    regressions = []
+    for size, cases in current.items():
+        for name, summary in cases.items():
+            base = baseline.get(size, {}).get(name)
+            if not base:
+                continue
+            for key in COMPARED_PERCENTILES:
+                old, new = base.get(key), summary.get(key)
+                if old is None or new is None:
+                    continue
+                if new > old * (1 + threshold) and new - old > MIN_REGRESSION_MS:
+                    regressions.append((size, name, key, old, new))
+    return regressions
+
+
+def print_results(size, cases, baseline_cases=None):
+    print(f'\n== {size} ==')
+    print(f'{"用例":<34}{"p50":>10}{"p95":>10}{"p99":>10}{"max":>10}{"ops/s":>10}{"p50变化":>10}')
+    for name, summary in cases.items():
+        change = ''
+        base = (baseline_cases or {}).get(name)
+        if base and base.get('p50_ms'):
+            change = f'{(summary["p50_ms"] / base["p50_ms"] - 1) * 100:+.0f}%'
+        print(f'{name:<34}{summary["p50_ms"]:>10.3f}{summary["p95_ms"]:>10.3f}'
+              f'{summary["p99_ms"]:>10.3f}{summary["max_ms"]:>10.3f}'
+              f'{summary["ops_per_sec"] or 0:>10.0f}{change:>10}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='TicketSystem 热点方法基准测试')
+    parser.add_argument('--size', nargs='+', default=['10k'],
+                        help='数据规模: 10k/1m/10m 或具体车票数')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS,
+                        help='每个用例的计时调用次数')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='基准数据库存放目录')
+    parser.add_argument('--json', help='将结果写入 JSON 文件')
+    parser.add_argument('--baseline', help='与该 JSON 基线比较，退化时返回非零状态')
+    parser.add_argument('--save-baseline', help='将本次结果保存为基线')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='分位数超过基线的比例阈值')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f).get('results', {})
+
+    results = {}
+    for size in args.size:
+        results[size] = run_size(size, args.iterations, args.data_dir)
+        print_results(size, results[size], baseline.get(size))
+
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'iterations': args.iterations,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for size, name, key, old, new in regressions:
+            print(f'性能退化: [{size}] {name} {key} {old:.3f}ms -> {new:.3f}ms')
+        if regressions:
+            return 1
+        print('\n未发现性能退化')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""WSGI 与 ASGI 服务模式吞吐量对比
+
+在进程内直接调用应用(不经过网络)，模拟固定数量的并发客户端持续发送
+车次查询和销售报表请求：
+
+- wsgi: 同步 worker 模式，固定数量的 worker 线程逐个处理请求
+- asgi: AsyncReadApp，查询和报表分别在各自的线程池中执行
+
+两种模式使用相同的线程总数，输出各自的吞吐量和查询/报表延迟分位数。
+
+    python -m benchmarks.serving_bench --size 1m --clients 64 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.test import EnvironBuilder  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.asgi import AsyncReadApp  # noqa: E402
+from benchmarks.dataset import DEFAULT_DATA_DIR, ensure_database  # noqa: E402
+from benchmarks.model_bench import Workload, summarize  # noqa: E402
+
+DEFAULT_CLIENTS = 32
+DEFAULT_DURATION = 10.0         # 秒
+DEFAULT_REPORT_RATIO = 0.1      # 报表请求占比
+
+
+class RequestMix:
+    """按比例生成查询和报表请求"""
+
+    def __init__(self, workload, report_ratio, seed):
+        self.workload = workload
+        self.report_ratio = report_ratio
+        self.rng = random.Random(seed)
+
+    def next(self):
+        if self.rng.random() < self.report_ratio:
+            start, end = self.workload.date_range(30)
+            return 'report', '/admin/reports', urlencode({'start_date': start,
+                                                          'end_date': end})
+        _, departure, destination = self.rng.choice(self.workload.trains)
+        travel_date = date.today() + timedelta(days=self.rng.randint(1, 25))
+        return 'search', '/tickets/search', urlencode({
+            'departure': departure, 'destination': destination,
+            'date': travel_date.strftime('%Y-%m-%d')})
+
+
+def admin_cookie(flask_app):
+    """以默认管理员登录，返回 Cookie 请求头"""
+    response = flask_app.test_client().post('/auth/login', data={
+        'username': 'admin', 'password': 'admin123', 'is_admin': 'on'})
+    return response.headers['Set-Cookie'].split(';', 1)[0]
+
+
+def make_app(database):
+    return create_app({
+        'DATABASE': database,
+        'SECRET_KEY': 'benchmark',
+        'METRICS_ENABLED': False,
+    })
+
+
+def collect(latencies, mode, elapsed, errors):
+    result = {'mode': mode, 'seconds': round(elapsed, 2), 'errors': errors}
+    total = sum(len(samples) for samples in latencies.values())
+    result['requests_per_sec'] = round(total / elapsed, 1)
+    for kind, samples in latencies.items():
+        if samples:
+            result[kind] = summarize(samples)
+    return result
+
+
+def run_wsgi(database, workload, args):
+    """同步 worker：客户端线程把请求交给固定数量的 worker 线程并等待"""
+    flask_app = make_app(database)
+    cookie = admin_cookie(flask_app)
+    workers = ThreadPoolExecutor(max_workers=args.workers)
+    latencies = {'search': [], 'report': []}
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def handle(path, query):
+        environ = EnvironBuilder(path=path, query_string=query,
+                                 headers={'Cookie': cookie}).get_environ()
+        status = []
+        body = flask_app(environ, lambda s, h, exc_info=None: status.append(s))
+        for _ in body:
+            pass
+        return status[0].startswith('200')
+
+    def client(n):
+        mix = RequestMix(workload, args.report_ratio, seed=n)
+        while time.perf_counter() < deadline:
+            kind, path, query = mix.next()
+            started = time.perf_counter()
+            ok = workers.submit(handle, path, query).result()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[kind].append(elapsed)
+                errors[0] += not ok
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    workers.shutdown()
+    return collect(latencies, 'wsgi', elapsed, errors[0])
+
+
+def run_asgi(database, workload, args):
+    """ASGI：客户端协程并发请求，查询和报表分别进入各自的线程池"""
+    flask_app = make_app(database)
+    flask_app.config['ASYNC_REPORT_WORKERS'] = args.report_workers
+    flask_app.config['ASYNC_SEARCH_WORKERS'] = args.workers - args.report_workers
+    cookie = admin_cookie(flask_app).encode('latin-1')
+    app = AsyncReadApp(flask_app)
+    latencies = {'search': [], 'report': []}
+    errors = [0]
+
+    async def request(path, query):
+        scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                 'path': path, 'root_path': '', 'query_string': query.encode('latin-1'),
+                 'headers': [(b'host', b'localhost'), (b'cookie', cookie)],
+                 'server': ('localhost', 80), 'client': ('127.0.0.1', 0)}
+        status = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await app(scope, receive, send)
+        return status == [200]
+
+    async def client(n, deadline):
+        mix = RequestMix(workload, args.report_ratio, seed=n)
+        while time.perf_counter() < deadline:
+            kind, path, query = mix.next()
+            started = time.perf_counter()
+            ok = await request(path, query)
+            latencies[kind].append(time.perf_counter() - started)
+            errors[0] += not ok
+
+    async def main():
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(*(client(n, deadline) for n in range(args.clients)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    app.shutdown()
+    return collect(latencies, 'asgi', elapsed, errors[0])
+
+
+def print_result(result):
+    print(f'\n== {result["mode"]} ==  {result["requests_per_sec"]} req/s'
+          f'  ({result["seconds"]}s, 错误 {result["errors"]})')
+    for kind in ('search', 'report'):
+        summary = result.get(kind)
+        if summary:
+            print(f'{kind:<8} 完成 {summary["count"]:>7}  p50 {summary["p50_ms"]:>9.2f}ms'
+                  f'  p95 {summary["p95_ms"]:>9.2f}ms  p99 {summary["p99_ms"]:>9.2f}ms')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='WSGI 与 ASGI 服务模式吞吐量对比')
+    parser.add_argument('--size', default='10k', help='数据规模: 10k/1m/10m 或具体车票数')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='基准数据库存放目录')
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS, help='并发客户端数')
+    parser.add_argument('--workers', type=int, default=10, help='处理请求的线程总数')
+    parser.add_argument('--report-workers', type=int, default=2,
+                        help='ASGI 模式下报表线程数(从线程总数中划出)')
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION,
+                        help='每种模式的压测时长(秒)')
+    parser.add_argument('--report-ratio', type=float, default=DEFAULT_REPORT_RATIO,
+                        help='报表请求占比')
+    parser.add_argument('--mode', nargs='+', default=['wsgi', 'asgi'],
+                        choices=['wsgi', 'asgi'], help='要测试的模式')
+    args = parser.parse_args(argv)
+
+    database = ensure_database(args.size, args.data_dir)
+    workload = Workload(database, iterations=100)
+    runners = {'wsgi': run_wsgi, 'asgi': run_asgi}
+    for mode in args.mode:
+        print_result(runners[mode](database, workload, args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
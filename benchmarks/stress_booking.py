@@ -0,0 +1,137 @@
+"""订票并发压力测试
+
+多个进程同时向同一车次同一日期抢票，结束后校验没有超售、没有重复座位，
+并且座位位图与 tickets 表一致。
+
+    python -m benchmarks.stress_booking --processes 8 --bookings 4000 --seats 1000
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.ticket_system import TicketSystem  # noqa: E402
+
+TRAIN_ID = 'STRESS1'
+TRAVEL_DATE = '2030-01-01'
+
+
+def setup_database(database, seats):
+    """建表并添加压测车次"""
+    system = TicketSystem(database)
+    system.create_tables()
+    system.add_train(TRAIN_ID, '压测始发', '压测终到', '08:00', '12:00', seats, 100.0)
+    system.close_db()
+
+
+def worker(database, count, worker_id, start_event, results):
+    """每个进程连续订 count 张票，统计各类结果"""
+    system = TicketSystem(database)
+    stats = {'success': 0, 'sold_out': 0, 'busy': 0, 'error': 0}
+    start_event.wait()
+    for i in range(count):
+        success, message = system.book_ticket(
+            TRAIN_ID, f'乘客{worker_id}-{i}', f'P{worker_id:03d}{i:06d}',
+            travel_date=TRAVEL_DATE
+        )
+        if success:
+            stats['success'] += 1
+        elif message == '无余票':
+            stats['sold_out'] += 1
+        elif '繁忙' in message:
+            stats['busy'] += 1
+        else:
+            stats['error'] += 1
+    system.close_db()
+    results.put(stats)
+
+
+def verify(database, seats, booked):
+    """校验超售、重复座位和位图计数，返回错误列表"""
+    conn = sqlite3.connect(database)
+    errors = []
+
+    sold = conn.execute('''
+    SELECT COUNT(*) FROM tickets
+    WHERE train_id = ? AND travel_date = ? AND status = '已售'
+    ''', (TRAIN_ID, TRAVEL_DATE)).fetchone()[0]
+    if sold > seats:
+        errors.append(f'超售: 售出 {sold} 张，座位 {seats} 个')
+    if sold != booked:
+        errors.append(f'成功订票 {booked} 次，但 tickets 中有 {sold} 张已售')
+
+    duplicates = conn.execute('''
+    SELECT seat_number, COUNT(*) FROM tickets
+    WHERE train_id = ? AND travel_date = ? AND status = '已售'
+    GROUP BY seat_number HAVING COUNT(*) > 1
+    ''', (TRAIN_ID, TRAVEL_DATE)).fetchall()
+    if duplicates:
+        errors.append(f'重复座位: {duplicates[:10]}')
+
+    row = conn.execute('''
+    SELECT sold_count FROM seat_inventory
+    WHERE train_id = ? AND travel_date = ?
+    ''', (TRAIN_ID, TRAVEL_DATE)).fetchone()
+    if row is None or row[0] != sold:
+        errors.append(f'座位位图计数 {row[0] if row else None} 与已售 {sold} 不一致')
+
+    conn.close()
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='订票并发压力测试')
+    parser.add_argument('--processes', type=int, default=8, help='并发进程数')
+    parser.add_argument('--bookings', type=int, default=4000, help='订票请求总数')
+    parser.add_argument('--seats', type=int, default=1000, help='车次座位数')
+    parser.add_argument('--database', help='数据库文件，默认使用临时文件')
+    args = parser.parse_args(argv)
+
+    database = args.database or os.path.join(tempfile.mkdtemp(), 'stress.db')
+    setup_database(database, args.seats)
+
+    per_worker = args.bookings // args.processes
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker,
+                                args=(database, per_worker, n, start_event, results))
+        for n in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    started = time.perf_counter()
+    start_event.set()
+    totals = {'success': 0, 'sold_out': 0, 'busy': 0, 'error': 0}
+    for _ in processes:
+        for key, value in results.get().items():
+            totals[key] += value
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    attempts = per_worker * args.processes
+    print(f'数据库: {database}')
+    print(f'进程数: {args.processes}  请求数: {attempts}  座位数: {args.seats}')
+    print(f'成功: {totals["success"]}  无余票: {totals["sold_out"]}  '
+          f'繁忙: {totals["busy"]}  失败: {totals["error"]}')
+    print(f'耗时: {elapsed:.2f}s  请求/秒: {attempts / elapsed:.0f}  '
+          f'成功订票/秒: {totals["success"] / elapsed:.0f}')
+
+    errors = verify(database, args.seats, totals['success'])
+    if errors:
+        for error in errors:
+            print(f'校验失败: {error}')
+        return 1
+    print('校验通过: 无超售、无重复座位')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
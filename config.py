@@ -11,6 +11,56 @@ class Config:
     
     # 数据库配置
     DB_INIT_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))  # 每个进程的连接池大小
+    DB_POOL_TIMEOUT = 30                                    # 等待空闲连接的超时（秒）
+    DB_PRAGMAS = {                                          # 每个连接打开时设置一次
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,       # 64MB 页缓存
+        'mmap_size': 268435456,     # 256MB 内存映射
+        'busy_timeout': 5000,       # 毫秒
+    }
+    DB_WRITE_RETRIES = 5                                    # 订票/退票/改签遇到锁冲突的重试次数
+    WRITE_QUEUE_ENABLED = os.environ.get('WRITE_QUEUE', '1') != '0'  # 0: 各连接直接写入，不经单写线程
+    WRITE_BATCH_SIZE = 64                                   # 单写线程一个事务最多合并的写请求数
+    
+    # ASGI 服务模式配置(asgi.py)
+    ASYNC_SEARCH_WORKERS = int(os.environ.get('ASYNC_SEARCH_WORKERS', 8))  # 车次/个人车票查询线程数
+    ASYNC_REPORT_WORKERS = int(os.environ.get('ASYNC_REPORT_WORKERS', 2))  # 报表/统计线程数
+    ASYNC_WSGI_WORKERS = 16                                                # 其余请求的线程数
+    
+    # 缓存配置
+    TRAIN_CACHE_CHECK_INTERVAL = 2.0   # 车次缓存检查其他进程修改的间隔（秒）
+    USER_CACHE_TTL = 60.0              # 用户信息缓存有效期（秒），其他进程的修改最多延迟这么久可见
+    USER_CACHE_SIZE = 1024             # 每个进程最多缓存的用户数
+    DASHBOARD_MAX_AGE = 60.0           # 仪表板快照最长使用时间（秒），其他进程的售票最多延迟这么久可见
+    
+    # 统计配置
+    STATISTICS_MODE = os.environ.get('STATISTICS_MODE', 'trigger')  # trigger: 同步更新 / events: 后台批量汇总
+    STATISTICS_FLUSH_INTERVAL = 5.0   # 事件模式下汇总间隔（秒）
+    STATISTICS_BATCH_SIZE = 5000      # 每个事务最多汇总的事件数
+    
+    # 监控配置
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'  # 记录请求与数据库指标，在 /admin/metrics 输出
+    SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG', '0') == '1'  # 记录慢查询及执行计划，在 /admin/slow_queries 查看
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))  # 慢查询阈值（毫秒）
+    SLOW_QUERY_LOG_SIZE = 200                                       # 保留最近的慢查询条数
+    
+    # 分页配置
+    PAGE_SIZE = 50         # 车票记录、报表、统计每页默认行数
+    MAX_PAGE_SIZE = 500    # limit 参数允许的最大行数
+    
+    # 登录配置
+    LAST_LOGIN_WRITE_BEHIND = os.environ.get('LAST_LOGIN_WRITE_BEHIND', '1') != '0'  # 0: 登录时同步写入最后登录时间
+    LAST_LOGIN_FLUSH_INTERVAL = 5.0   # 写回间隔（秒）
+    
+    # 订票配置
+    GROUP_BOOKING_MAX_SIZE = 500   # 团体订票单次最多乘客数
+    
+    # 换乘查询配置
+    ROUTE_MAX_TRANSFERS = 2                 # 最多换乘次数
+    ROUTE_MIN_CONNECTION_MINUTES = 20       # 最短换乘时间（分钟）
+    ROUTE_MAX_CONNECTION_MINUTES = 360      # 最长换乘等待时间（分钟）
     
     # 会话配置
     PERMANENT_SESSION_LIFETIME = 3600  # 会话有效期（秒）
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.models import get_db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """使用临时数据库的应用，已建表"""
+    app = create_app({
+        'DATABASE': str(tmp_path / 'ticket_system.db'),
+        'SECRET_KEY': 'test',
+        'TESTING': True,
+    })
+    with app.app_context():
+        get_db().create_tables()
+    return app
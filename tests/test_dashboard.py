@@ -0,0 +1,51 @@
+import threading
+from datetime import date
+
+from app.models import get_db
+
+
+def test_rebuild_installs_snapshot_under_concurrent_writes(app):
+    today = date.today().strftime('%Y-%m-%d')
+    with app.app_context():
+        ts = get_db()
+        train_id = ts.get_db().execute(
+            'SELECT train_id FROM trains ORDER BY total_seats DESC LIMIT 1').fetchone()[0]
+        snapshot = ts.dashboard
+    stop = threading.Event()
+    errors = []
+
+    def book(worker):
+        with app.app_context():
+            ts = get_db()
+            n = 0
+            while not stop.is_set():
+                n += 1
+                ok, message = ts.book_ticket(train_id, f'乘客{worker}-{n}',
+                                             f'4401{worker:02d}{n:012d}', travel_date=today)
+                if not ok and message != '无余票':
+                    errors.append(message)
+
+    writers = [threading.Thread(target=book, args=(i,)) for i in range(4)]
+    for writer in writers:
+        writer.start()
+    try:
+        for _ in range(20):
+            snapshot.invalidate()
+            with app.app_context():
+                get_db().get_dashboard()
+            assert snapshot._date == today
+    finally:
+        stop.set()
+        for writer in writers:
+            writer.join()
+    assert not errors
+
+    # 写操作结束后，快照与数据库一致
+    with app.app_context():
+        ts = get_db()
+        cached = ts.get_dashboard()
+        snapshot.invalidate()
+        loaded = ts.get_dashboard()
+    assert cached.tickets_sold > 0
+    assert (cached.tickets_sold, round(cached.total_revenue, 2)) == \
+        (loaded.tickets_sold, round(loaded.total_revenue, 2))
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from app.models import get_db
+from app.models.write_queue import get_write_queue
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='需要 os.fork')
+def test_forked_child_writes_through_own_queue(app):
+    database = app.config['DATABASE']
+    parent_queue = get_write_queue(database)
+    assert parent_queue is not None and parent_queue.pid == os.getpid()
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # 子进程: 断言失败时以非零状态退出，结果经管道交给父进程
+        status = 1
+        try:
+            os.close(read_fd)
+            with app.app_context():
+                ts = get_db()
+                ok, message = ts.register_user('forked', 'secret123', '子进程', '110101199912319999')
+                write_queue = get_write_queue(database)
+                result = (ok, message, write_queue.pid == os.getpid(), write_queue.status())
+            os.write(write_fd, repr(result).encode())
+            status = 0
+        finally:
+            os._exit(status)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as reader:
+        output = reader.read()
+    _, status = os.waitpid(pid, 0)
+    assert status == 0, output
+    ok, message, own_queue, child_status = eval(output)
+    assert ok, message
+    assert own_queue
+    assert child_status['running']
+    assert child_status['total_requests'] == 1
+    assert parent_queue.total_requests == 0
+
+    conn = get_write_queue(database).pool.acquire()
+    try:
+        row = conn.execute("SELECT COUNT(*) FROM users WHERE username = 'forked'").fetchone()
+    finally:
+        get_write_queue(database).pool.release(conn)
+    assert row[0] == 1